@@ -0,0 +1,462 @@
+"""
+A local stand-in for the GitHub REST and GraphQL APIs that serves synthetic repositories, so that
+the mining engine can be benchmarked without a token, rate limits or network variance. It serves
+the endpoints the modules use, with the same pagination (Link headers), rate limit headers and
+lazy completion (commit details), list filters and Last-Modified headers as GitHub.
+"""
+import base64
+import collections
+import dataclasses
+import datetime
+import email.utils
+import functools
+import hashlib
+import json
+import re
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from engine.blobs import blob_sha
+
+EPOCH = datetime.datetime(2024, 1, 1)
+
+# Workflow templates; repositories that use the same template have identical workflow files, like
+# forks and starter workflows on GitHub
+WORKFLOW_TEMPLATES = [
+    "name: CI\non: [push, pull_request]\njobs:\n  test:\n    runs-on: ${{ matrix.os }}\n    strategy:\n"
+    "      matrix:\n        os: [ubuntu-latest, windows-latest]\n        python: ['3.10', '3.11', '3.12']\n"
+    "    steps:\n      - uses: actions/checkout@v4\n      - uses: actions/setup-python@v5\n"
+    "        with: {python-version: '${{ matrix.python }}', cache: pip}\n      - run: pytest\n",
+    "name: Lint\non:\n  push:\n    branches: [main]\njobs:\n  lint:\n    runs-on: ubuntu-latest\n"
+    "    steps:\n      - uses: actions/checkout@v4\n      - run: make lint\n",
+    "name: Release\non:\n  release:\n    types: [published]\njobs:\n  publish:\n    runs-on: ubuntu-latest\n"
+    "    steps:\n      - uses: actions/checkout@v4\n      - uses: actions/cache@v4\n      - run: make publish\n",
+]
+
+TOPICS = ["synthetic", "benchmark"]
+
+README = (
+    "# Synthetic repository\n\n[![CI](https://github.com/{name}/actions/workflows/ci0.yml/badge.svg)]"
+    "(https://github.com/{name}/actions)\n\n" + "Some text about the project, its usage and its tests. " * 40
+)
+
+
+@dataclasses.dataclass
+class SyntheticRepo:  # pylint: disable=too-many-instance-attributes
+    """
+    The size of a synthetic repository. Its contents are generated deterministically from its name
+    and these sizes.
+
+    Attributes
+    ----------
+    full_name : str
+        owner/name of the repository
+    commits, pulls, issues, releases, contributors, branches : int
+        Number of items of each kind
+    depth, width, files_per_dir : int
+        The directory tree: every directory has width subdirectories down to depth levels, and
+        files_per_dir files
+    workflows : int
+        Number of GitHub Actions workflow files
+    files_per_commit : int
+        Number of files changed by every commit
+    truncate_tree_over : int
+        Number of entries over which recursive tree listings are truncated, like GitHub does at
+        about 100 000 entries
+    """
+    full_name: str
+    commits: int = 200
+    pulls: int = 50
+    issues: int = 50
+    releases: int = 10
+    contributors: int = 20
+    branches: int = 5
+    depth: int = 3
+    width: int = 3
+    files_per_dir: int = 5
+    workflows: int = 3
+    files_per_commit: int = 3
+    truncate_tree_over: int = 100_000
+
+    @functools.cached_property
+    def blobs(self):
+        """{sha: contents} of the files that can be downloaded"""
+        return {blob_sha(content): content for content in self._contents.values()}
+
+    @functools.cached_property
+    def tree(self):
+        """{path: (type, sha)} of every entry, in the order of a recursive listing"""
+        entries = {".github": ("tree", _sha("tree", self.full_name, ".github")),
+                   ".github/workflows": ("tree", _sha("tree", self.full_name, ".github/workflows"))}
+        for path, content in self._contents.items():
+            entries[path] = ("blob", blob_sha(content))
+        self._add_directory("", 0, entries)
+        return dict(sorted(entries.items()))
+
+    @functools.cached_property
+    def trees(self):
+        """{sha: path} of every directory, the root being ''"""
+        return {"main": "", **{sha: path for path, (kind, sha) in self.tree.items() if kind == "tree"}}
+
+    @functools.cached_property
+    def files(self):
+        """The paths of all files"""
+        return [path for path, (kind, _) in self.tree.items() if kind == "blob"]
+
+    @functools.cached_property
+    def commits_of_path(self):
+        """{path: [commit index]} of the commits that changed every file"""
+        commits = collections.defaultdict(list)
+        for index in range(self.commits):
+            for path in self.changed_files(index):
+                commits[path].append(index)
+        return commits
+
+    def changed_files(self, index):
+        """The paths of the files changed by commit index (0 is the newest)"""
+        files = self.files
+        paths = {files[(index * 7919 + offset * 104729) % len(files)] for offset in range(self.files_per_commit)}
+        if self.workflows and index % 10 == 0:
+            paths.add(f".github/workflows/ci{index // 10 % self.workflows}.yml")
+        return sorted(paths)
+
+    def commit_sha(self, index):
+        """The SHA of commit index"""
+        return _sha("commit", self.full_name, str(index))
+
+    @functools.cached_property
+    def commit_indexes(self):
+        """{sha: index} of all commits"""
+        return {self.commit_sha(index): index for index in range(self.commits)}
+
+    @functools.cached_property
+    def _contents(self):
+        contents = {"README.md": README.format(name=self.full_name).encode()}
+        for index in range(self.workflows):
+            contents[f".github/workflows/ci{index}.yml"] = WORKFLOW_TEMPLATES[index % len(WORKFLOW_TEMPLATES)].encode()
+        return contents
+
+    def _add_directory(self, path, level, entries):
+        prefix = path + "/" if path else ""
+        for index in range(self.files_per_dir):
+            entries[f"{prefix}file{index}.py"] = ("blob", _sha("blob", self.full_name, f"{prefix}file{index}.py"))
+        if level < self.depth:
+            for index in range(self.width):
+                child = f"{prefix}dir{index}"
+                entries[child] = ("tree", _sha("tree", self.full_name, child))
+                self._add_directory(child, level + 1, entries)
+
+
+class FakeGitHub:
+    """
+    A threaded HTTP server that answers GitHub REST and GraphQL requests for a set of synthetic
+    repositories. Unknown repositories and endpoints are answered with 404.
+
+    Parameters
+    ----------
+    repos : list
+        The SyntheticRepo instances to serve
+
+    Attributes
+    ----------
+    base_url : str
+        The URL to pass to Github(base_url=...), set by start()
+    requests : collections.Counter
+        The number of requests per endpoint, such as 'commits' or 'git/trees/:sha'
+
+    Methods
+    -------
+    start()
+        Starts serving on a free local port and returns base_url
+    stop()
+        Stops the server
+    reset()
+        Resets the request counters
+    """
+
+    def __init__(self, repos):
+        self.repos = {repo.full_name: repo for repo in repos}
+        self.requests = collections.Counter()
+        self.base_url = None
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        """Starts serving on a free local port and returns the base URL"""
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}"
+        return self.base_url
+
+    def stop(self):
+        """Stops the server"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        """Resets the request counters"""
+        with self._lock:
+            self.requests.clear()
+
+    def count(self, endpoint):
+        """Counts a request to endpoint"""
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def get(self, path, query):
+        """Returns (status, body, headers) for a GET of path with the parsed query string"""
+        match = re.fullmatch(r"/repos/([^/]+/[^/]+)(?:/(.*))?", path)
+        repo = self.repos.get(match.group(1)) if match else None
+        if repo is None:
+            self.count("other")
+            return 404, {"message": "Not Found"}, {}
+
+        endpoint = match.group(2) or ""
+        handlers = {
+            "": self._repo, "commits": self._commits, "contributors": self._contributors,
+            "branches": self._branches, "releases": self._releases, "issues": self._issues,
+            "pulls": self._pulls, "actions/workflows": self._workflows, "topics": self._topics,
+            "readme": self._readme,
+        }
+        prefixes = {
+            "commits/": self._commit, "git/commits/": self._git_commit, "git/trees/": self._tree,
+            "git/blobs/": self._blob,
+        }
+        for prefix, handler in prefixes.items():
+            if endpoint.startswith(prefix):
+                self.count(prefix + ":sha")
+                return handler(repo, endpoint[len(prefix):], query)
+        if endpoint not in handlers:
+            self.count("other")
+            return 404, {"message": "Not Found"}, {}
+        self.count(endpoint or "repo")
+        return handlers[endpoint](repo, path, query)
+
+    def graphql(self, query):
+        """Returns (status, body) for a GraphQL query of repository metadata aliases"""
+        self.count("graphql")
+        data = {}
+        for alias, owner, name in re.findall(r'(\w+): repository\(owner: "([^"]*)", name: "([^"]*)"\)', query):
+            repo = self.repos.get(f"{owner}/{name}")
+            data[alias] = None if repo is None else {
+                "description": f"Synthetic repository {repo.full_name}",
+                "createdAt": _date(EPOCH - datetime.timedelta(days=1000)),
+                "stargazerCount": 10 * repo.contributors, "forkCount": repo.contributors,
+                "diskUsage": len(repo.files), "watchers": {"totalCount": repo.contributors},
+                "repositoryTopics": {"nodes": [{"topic": {"name": name}} for name in TOPICS]},
+            }
+        return 200, {"data": data}
+
+    def _repo(self, repo, _path, _query):
+        owner, name = repo.full_name.split("/")
+        return 200, {
+            "id": int(_sha("id", repo.full_name)[:8], 16), "name": name, "full_name": repo.full_name,
+            "owner": {"login": owner}, "default_branch": "main", "size": len(repo.files),
+            "description": f"Synthetic repository {repo.full_name}",
+            "created_at": _date(EPOCH - datetime.timedelta(days=1000)),
+            "stargazers_count": 10 * repo.contributors, "subscribers_count": repo.contributors,
+            "forks_count": repo.contributors, "url": self._url(f"/repos/{repo.full_name}"),
+        }, {}
+
+    def _commits(self, repo, path, query):
+        indexes = repo.commits_of_path.get(query["path"], []) if "path" in query else range(repo.commits)
+        if "since" in query:
+            since = datetime.datetime.fromisoformat(query["since"].rstrip("Z"))
+            indexes = [index for index in indexes if _commit_date(index) >= since]
+        return self._page(path, query, indexes, lambda index: self._commit_json(repo, index))
+
+    def _commit(self, repo, sha, _query):
+        index = repo.commit_indexes.get(sha)
+        if index is None:
+            return 404, {"message": "Not Found"}, {}
+        commit = self._commit_json(repo, index)
+        commit["files"] = [
+            {"filename": path, "status": "modified", "additions": 3, "deletions": 1, "changes": 4}
+            for path in repo.changed_files(index)
+        ]
+        return 200, commit, {"Last-Modified": _http_date(_commit_date(index))}
+
+    def _git_commit(self, repo, sha, _query):
+        index = repo.commit_indexes.get(sha)
+        if index is None:
+            return 404, {"message": "Not Found"}, {}
+        return 200, {"sha": sha, **self._commit_json(repo, index)["commit"]}, {
+            "Last-Modified": _http_date(_commit_date(index))
+        }
+
+    def _commit_json(self, repo, index):
+        sha = repo.commit_sha(index)
+        person = {"name": f"user{index % repo.contributors}", "date": _date(_commit_date(index))}
+        return {
+            "sha": sha, "url": self._url(f"/repos/{repo.full_name}/commits/{sha}"),
+            # like GitHub, the git commit of a listed commit has no sha, only a url to complete it
+            "commit": {"message": f"Commit {index}\n\nChanges the synthetic files.", "author": person,
+                       "committer": person, "url": self._url(f"/repos/{repo.full_name}/git/commits/{sha}")},
+        }
+
+    def _contributors(self, repo, path, query):
+        return self._page(path, query, range(repo.contributors), lambda index: {
+            "login": f"user{index}", "id": index, "contributions": repo.commits // (index + 1),
+        })
+
+    def _branches(self, repo, path, query):
+        return self._page(path, query, range(repo.branches), lambda index: {
+            "name": "main" if index == 0 else f"branch{index}", "commit": {"sha": repo.commit_sha(index)},
+        })
+
+    def _releases(self, repo, path, query):
+        return self._page(path, query, range(repo.releases), lambda index: {
+            "id": repo.releases - index, "tag_name": f"v{repo.releases - index}.0",
+            "published_at": _date(EPOCH - datetime.timedelta(days=30 * index)),
+            "created_at": _date(EPOCH - datetime.timedelta(days=30 * index)),
+        })
+
+    def _issues(self, repo, path, query):
+        return self._items(path, query, repo.issues)
+
+    def _pulls(self, repo, path, query):
+        # the pulls endpoint of GitHub has no since filter
+        return self._items(path, {key: value for key, value in query.items() if key != "since"}, repo.pulls)
+
+    def _workflows(self, repo, _path, _query):
+        workflows = [{
+            "id": index + 1, "name": f"CI {index}", "path": f".github/workflows/ci{index}.yml", "state": "active",
+            "created_at": _date(EPOCH - datetime.timedelta(days=100)), "updated_at": _date(EPOCH),
+        } for index in range(repo.workflows)]
+        return 200, {"total_count": len(workflows), "workflows": workflows}, {}
+
+    def _topics(self, _repo, _path, _query):
+        return 200, {"names": TOPICS}, {}
+
+    def _readme(self, repo, _path, _query):
+        content = repo._contents["README.md"]  # pylint: disable=protected-access
+        return 200, {
+            "type": "file", "name": "README.md", "path": "README.md", "sha": blob_sha(content),
+            "encoding": "base64", "content": base64.b64encode(content).decode(), "size": len(content),
+        }, {}
+
+    def _tree(self, repo, sha, query):
+        directory = repo.trees.get(sha)
+        if directory is None:
+            return 404, {"message": "Not Found"}, {}
+        prefix = directory + "/" if directory else ""
+        entries = [
+            (path[len(prefix):], kind, entry_sha) for path, (kind, entry_sha) in repo.tree.items()
+            if path.startswith(prefix) and (query.get("recursive") or "/" not in path[len(prefix):])
+        ]
+        truncated = len(entries) > repo.truncate_tree_over
+        return 200, {
+            "sha": sha, "truncated": truncated,
+            "tree": [
+                {"path": path, "mode": "040000" if kind == "tree" else "100644", "type": kind, "sha": entry_sha}
+                for path, kind, entry_sha in entries[:repo.truncate_tree_over]
+            ],
+        }, {}
+
+    def _blob(self, repo, sha, _query):
+        content = repo.blobs.get(sha)
+        if content is None:
+            return 404, {"message": "Not Found"}, {}
+        return 200, {"sha": sha, "size": len(content), "encoding": "base64",
+                     "content": base64.b64encode(content).decode()}, {}
+
+    def _items(self, path, query, count):
+        """
+        Returns the page of the count issues or pull requests that match the state and since filters
+        of query, in the order of its sort and direction, with the defaults of GitHub: open items,
+        newest created first
+        """
+        items = [_item(count - index, index) for index in range(count)]
+        state = query.get("state", "open")
+        if state != "all":
+            items = [item for item in items if item["state"] == state]
+        if "since" in query:
+            since = _date(datetime.datetime.fromisoformat(query["since"].rstrip("Z")))
+            items = [item for item in items if item["updated_at"] >= since]
+        key = "updated_at" if query.get("sort") == "updated" else "created_at"
+        items.sort(key=lambda item: (item[key], item["number"]), reverse=query.get("direction", "desc") == "desc")
+        return self._page(path, query, items, lambda item: item)
+
+    def _page(self, path, query, indexes, to_json):
+        """Returns the page of indexes asked for in query, with a Link header like GitHub's"""
+        per_page = int(query.get("per_page", 30))
+        page = int(query.get("page", 1))
+        indexes = list(indexes)
+        last = max((len(indexes) + per_page - 1) // per_page, 1)
+        items = [to_json(index) for index in indexes[(page - 1) * per_page:page * per_page]]
+
+        links = []
+        for rel, number in (("next", page + 1), ("last", last)):
+            if page < last:
+                links.append(f'<{self._url(path, {**query, "page": number})}>; rel="{rel}"')
+        return 200, items, {"Link": ", ".join(links)} if links else {}
+
+    def _url(self, path, query=None):
+        return self.base_url + path + ("?" + urllib.parse.urlencode(query) if query else "")
+
+
+def _handler(github):
+    class Handler(BaseHTTPRequestHandler):
+        """Answers the requests of one connection from the synthetic repositories of github"""
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Answers a REST request"""
+            url = urllib.parse.urlparse(self.path)
+            self._send(*github.get(url.path, dict(urllib.parse.parse_qsl(url.query))))
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            """Answers a GraphQL request"""
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if urllib.parse.urlparse(self.path).path != "/graphql":
+                self._send(404, {"message": "Not Found"})
+                return
+            self._send(*github.graphql(body.get("query", "")))
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            """Does not log requests"""
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("X-RateLimit-Limit", "1000000")
+            self.send_header("X-RateLimit-Remaining", "1000000")
+            self.send_header("X-RateLimit-Reset", "9999999999")
+            self.send_header("X-RateLimit-Resource", "graphql" if self.path.startswith("/graphql") else "core")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def _item(number, index):
+    """An issue or pull request; every other one is closed"""
+    created = EPOCH - datetime.timedelta(days=2 * index + 2)
+    closed = created + datetime.timedelta(days=index % 7 + 1) if index % 2 else None
+    return {
+        "id": number, "number": number, "title": f"Item {number}", "body": f"Body of item {number}",
+        "state": "closed" if closed else "open", "created_at": _date(created),
+        "updated_at": _date(closed or created), "closed_at": closed and _date(closed),
+    }
+
+
+def _commit_date(index):
+    return EPOCH - datetime.timedelta(hours=6 * index)
+
+
+def _http_date(date):
+    return email.utils.format_datetime(date.replace(tzinfo=datetime.timezone.utc), usegmt=True)
+
+
+def _date(date):
+    return date.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _sha(*parts):
+    return hashlib.sha1(":".join(parts).encode()).hexdigest()
@@ -0,0 +1,165 @@
+"""
+Offline benchmark of the mining engine. Serves synthetic repositories from a local stand-in of the
+GitHub API (see benchmarks.fake_github) and mines them with RepoInfoExtractor, once with all modules
+and once per module, reporting the requests issued, the throughput and the peak memory.
+
+Run it from the root of the project, e.g.
+
+    python -m benchmarks.run --repos 20 --commits 500 --depth 4 --json results.json
+"""
+import argparse
+import dataclasses
+import functools
+import inspect
+import json
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fake_github import FakeGitHub, SyntheticRepo
+from engine.blobs import BlobStore
+from engine.governor import RateLimitGovernor
+from engine.http import install_hook, remove_hook
+from engine.profiler import Profiler
+from main import RepoInfoExtractor, _module_class, _module_name
+from modules.commits_module import CommitsModule, CommitParams
+from modules.contributors_module import ContributorsModule, ContributorsParams
+from modules.description_module import DescriptionModule
+from modules.issue_module import IssueModule
+from modules.popularity_module import PopularityModule, PopularityParams
+from modules.pull_request_module import PullRequestModule
+from modules.readme_module import ReadMeModule
+from modules.release_module import ReleaseModule
+from modules.repository_module import RepositoryModule
+from modules.size_module import SizeModule, SizeParams
+from modules.topics_module import TopicsModule
+from modules.workflow_config_module import WorkflowConfigModule
+from modules.workflow_module import WorkflowModule
+
+
+def module_factories(blob_store):
+    """
+    Returns {name: factory} of every module with all its params. SourceCodeModule is left out, since
+    it clones from github.com.
+    """
+    return {
+        "CommitsModule": CommitsModule,
+        "CommitsModule(count)": functools.partial(CommitsModule, [CommitParams.COUNT.value]),
+        "ContributorsModule": functools.partial(ContributorsModule, [param.value for param in ContributorsParams]),
+        "DescriptionModule": DescriptionModule,
+        "IssueModule": IssueModule,
+        "PopularityModule": functools.partial(PopularityModule, [param.value for param in PopularityParams]),
+        "PullRequestModule": PullRequestModule,
+        "ReadMeModule": ReadMeModule,
+        "ReleaseModule": ReleaseModule,
+        "RepositoryModule": RepositoryModule,
+        "SizeModule": functools.partial(SizeModule, [param.value for param in SizeParams]),
+        "TopicsModule": TopicsModule,
+        "WorkflowConfigModule": functools.partial(WorkflowConfigModule, blob_store=blob_store),
+        "WorkflowModule": WorkflowModule,
+    }
+
+
+def run_scenario(github, governor, repo_names, modules, workers=1, module_workers=1):
+    # pylint: disable=too-many-arguments
+    """
+    Mines repo_names with modules against the fake API github and returns the requests issued
+    (total and per endpoint), the time taken, the throughput, the peak memory and, per module with
+    params, the requests the profiler could not attribute to a param
+    """
+    github.reset()
+    extractor = RepoInfoExtractor(None, include_non_ci=True, modules=modules, module_workers=module_workers,
+                                  governor=governor, base_url=github.base_url)
+    profiler = Profiler()
+    install_hook(profiler)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        extractor.extract_info_for_repos(repo_names, workers=workers)
+    finally:
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        remove_hook(profiler)
+        profiler.close()
+        extractor.close()
+
+    with_params = {
+        _module_name(factory) for factory in modules
+        if 'params' in inspect.signature(_module_class(factory).__init__).parameters
+    }
+    unlabelled = {}
+    for total in profiler.totals():
+        if total['module'] in with_params and total['param'] is None and total['requests']:
+            unlabelled[total['module']] = unlabelled.get(total['module'], 0) + total['requests']
+
+    return {
+        "repos": len(extractor.ci_repos),
+        "requests": sum(github.requests.values()),
+        "requests_per_repo": sum(github.requests.values()) / max(len(repo_names), 1),
+        "seconds": seconds,
+        "repos_per_minute": 60 * len(extractor.ci_repos) / seconds if seconds else 0,
+        "peak_mb": peak / 1024 ** 2,
+        "endpoints": dict(github.requests.most_common()),
+        "unlabelled_requests": unlabelled,
+    }
+
+
+def parse_args():
+    """Parses the command line arguments of the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repos", type=int, default=10, help="number of synthetic repositories (default: 10)")
+    for field in dataclasses.fields(SyntheticRepo):
+        if field.type is int and field.name != "truncate_tree_over":
+            parser.add_argument(f"--{field.name.replace('_', '-')}", type=int, default=field.default,
+                                help=f"{field.name.replace('_', ' ')} of every repository (default: {field.default})")
+    parser.add_argument("--workers", type=int, default=1, help="repositories mined concurrently (default: 1)")
+    parser.add_argument("--module-workers", type=int, default=1,
+                        help="modules of a repository mined concurrently (default: 1)")
+    parser.add_argument("--modules", nargs="*",
+                        help="only benchmark these modules on their own (default: all of them)")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to this JSON file")
+    return parser.parse_args()
+
+
+def main():
+    """Runs the benchmark scenarios and prints a table of the results"""
+    args = parse_args()
+    sizes = {field.name: getattr(args, field.name) for field in dataclasses.fields(SyntheticRepo) if hasattr(args, field.name)}
+    repos = [SyntheticRepo(f"bench/repo{index}", **sizes) for index in range(args.repos)]
+    github = FakeGitHub(repos)
+    github.start()
+    governor = RateLimitGovernor()
+    install_hook(governor)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        blob_store = BlobStore(directory)
+        factories = module_factories(blob_store)
+        scenarios = {"all modules": list(factories.values())}
+        scenarios.update({
+            name: [factory] for name, factory in factories.items() if not args.modules or name in args.modules
+        })
+        try:
+            for name, modules in scenarios.items():
+                results[name] = run_scenario(github, governor, [repo.full_name for repo in repos], modules,
+                                             workers=args.workers, module_workers=args.module_workers)
+        finally:
+            blob_store.close()
+            remove_hook(governor)
+            github.stop()
+
+    print(f"{'scenario':<28}{'requests':>10}{'req/repo':>10}{'seconds':>10}{'repos/min':>11}{'peak MB':>9}")
+    for name, result in results.items():
+        print(f"{name:<28}{result['requests']:>10}{result['requests_per_repo']:>10.1f}{result['seconds']:>10.2f}"
+              f"{result['repos_per_minute']:>11.1f}{result['peak_mb']:>9.1f}")
+    for name, result in results.items():
+        if result['unlabelled_requests']:
+            print(f"{name}: requests without a param label: {result['unlabelled_requests']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"sizes": sizes, "repos": args.repos, "results": results}, file, indent=3)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Archive of the raw API responses of a run, for mining again offline"""
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+from engine.http import HttpResponse
+
+# Size at which a segment is closed and the next one is started
+SEGMENT_BYTES = 256 * 1024 ** 2
+# Number of responses after which the index is committed, so that a crash loses at most these
+COMMIT_EVERY = 1000
+
+
+class ArchiveMissError(Exception):
+    """Raised when a replayed run makes a request that is not in the archive"""
+
+
+class ResponseRecorder:
+    """
+    A request hook (see engine.http) that archives the final response of every request in
+    directory, so that the run can be replayed without network by ResponseReplayer. Responses are
+    appended zlib-compressed to segment files of at most SEGMENT_BYTES, and index.sqlite maps every
+    request to the segment, offset and length of its response. A request that is recorded again
+    points to its latest response.
+
+    Install it after the Profiler and before the other hooks, so that it sees the responses the
+    response cache replays and not the rate limit responses that are retried.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the archive. It is created if it does not exist, and an existing archive
+        is added to.
+
+    Attributes
+    ----------
+    recorded : int
+        Number of responses recorded in this run
+
+    Methods
+    -------
+    before_request(request)
+        Does nothing; responses are recorded after they arrive
+    after_response(request, response)
+        Appends the response to the current segment
+    close()
+        Closes the segment and the index
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._index = _open_index(directory)
+        segments = sorted(glob.glob(os.path.join(directory, "segment-*.bin")))
+        self._segment = len(segments) - 1 if segments else 0
+        self._file = None
+        self._open_segment()
+
+    def before_request(self, _request):
+        """Does nothing; the response is recorded in after_response"""
+
+    def after_response(self, request, response):
+        """Archives response, unless a hook asked for the request to be retried"""
+        if request.context.get("retry"):
+            return response
+
+        record = zlib.compress(json.dumps({
+            'status': response.status, 'headers': response.headers, 'text': response.text,
+        }).encode("utf-8"))
+        with self._lock:
+            if self._file.tell() + len(record) > SEGMENT_BYTES and self._file.tell() > 0:
+                self._segment += 1
+                self._open_segment()
+            offset = self._file.tell()
+            self._file.write(record)
+            self._index.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (request_key(request), self._segment, offset, len(record))
+            )
+            self.recorded += 1
+            if self.recorded % COMMIT_EVERY == 0:
+                # the index must never point past what is on disk
+                self._file.flush()
+                self._index.commit()
+        return response
+
+    def close(self):
+        """Flushes and closes the current segment and the index"""
+        with self._lock:
+            self._file.close()
+            self._index.commit()
+            self._index.close()
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.flush()
+            self._index.commit()
+            self._file.close()
+        self._file = open(_segment_path(self.directory, self._segment), "ab")  # pylint: disable=consider-using-with
+
+
+class ResponseReplayer:
+    """
+    A request hook (see engine.http) that answers every request from an archive written by
+    ResponseRecorder, so that nothing is sent over the network. Install it right after the Profiler,
+    so that the rate limit hooks and the response cache never see the requests. A request that is not
+    in the archive raises ArchiveMissError, which fails the module that made it instead of mining it
+    with data that does not exist.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the archive
+
+    Attributes
+    ----------
+    hits : int
+        Number of requests answered from the archive
+    misses : int
+        Number of requests that were not in the archive
+
+    Methods
+    -------
+    before_request(request)
+        Returns the archived response of request
+    after_response(request, response)
+        Returns response unchanged
+    stats()
+        Returns the hit and miss counters
+    close()
+        Closes the segments and the index
+    """
+
+    def __init__(self, directory):
+        if not os.path.exists(os.path.join(directory, "index.sqlite")):
+            raise FileNotFoundError(f"No response archive in {directory}")
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = _open_index(directory)
+        self._segments = {}
+
+    def before_request(self, request):
+        """Returns the archived response of request, or raises ArchiveMissError"""
+        key = request_key(request)
+        with self._lock:
+            row = self._index.execute(
+                "SELECT segment, offset, length FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                raise ArchiveMissError(f"{request.verb} {request.url} is not in the archive {self.directory}")
+            self.hits += 1
+            segment, offset, length = row
+            if segment not in self._segments:
+                self._segments[segment] = os.open(_segment_path(self.directory, segment), os.O_RDONLY)
+            descriptor = self._segments[segment]
+
+        # pread does not move a shared file position, so threads can read at the same time
+        record = json.loads(zlib.decompress(os.pread(descriptor, length, offset)))
+        return HttpResponse(record['status'], record['headers'], record['text'], from_cache=True)
+
+    def after_response(self, _request, response):
+        """Returns response unchanged"""
+        return response
+
+    def stats(self):
+        """Returns the hit and miss counters"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        """Closes the segments and the index"""
+        with self._lock:
+            for descriptor in self._segments.values():
+                os.close(descriptor)
+            self._segments.clear()
+            self._index.close()
+
+
+def request_key(request):
+    """
+    Returns the key of a request in the archive: its verb, path and query, media type and a hash of
+    its body (GraphQL queries are POSTs to the same URL). The token is not part of the key.
+    """
+    body = request.body if isinstance(request.body, bytes) else str(request.body or "").encode("utf-8")
+    return "\n".join((
+        request.verb, request.url, request.headers.get("Accept", ""), hashlib.sha1(body).hexdigest(),
+    ))
+
+
+def _open_index(directory):
+    index = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+    index.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        " key TEXT PRIMARY KEY, segment INTEGER, offset INTEGER, length INTEGER)"
+    )
+    index.commit()
+    return index
+
+
+def _segment_path(directory, segment):
+    return os.path.join(directory, f"segment-{segment:05d}.bin")
@@ -0,0 +1,108 @@
+"""Content-addressed store of downloaded files, such as the CI configs of the mined repositories"""
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+
+
+class BlobStore:
+    """
+    Stores every file once, compressed, under its git blob SHA in <root>/blobs/<sha[:2]>/<sha>, and
+    keeps a manifest of which file of which repository has which blob in <root>/manifest.sqlite.
+    Since the blob SHA of a file is known from the tree listing of its repository before it is
+    downloaded, a file whose contents are already stored (because another repository has the same
+    file, or an earlier run stored it) is not downloaded again.
+
+    Parameters
+    ----------
+    root : str
+        The directory of the store. It is created if it does not exist.
+
+    Methods
+    -------
+    has(sha)
+        Whether a blob is stored
+    put(data)
+        Stores the contents of a file and returns its blob SHA
+    get(sha)
+        Returns the contents of a stored blob
+    add(repo_name, platform, path, sha)
+        Records in the manifest that a file of a repository has a blob
+    files(repo_name)
+        Returns the manifest entries of a repository
+    close()
+        Closes the manifest
+    """
+
+    def __init__(self, root):
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self.root = root
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "manifest.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " repo TEXT, platform TEXT, path TEXT, sha TEXT,"
+            " PRIMARY KEY (repo, path))"
+        )
+        self._db.commit()
+
+    def has(self, sha):
+        """Whether the blob with SHA sha is stored"""
+        return os.path.exists(self._path(sha))
+
+    def put(self, data):
+        """Stores data (bytes) unless it is already stored, and returns its blob SHA"""
+        sha = blob_sha(data)
+        path = self._path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # a unique temporary name, so threads storing the same blob do not write the same file
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(zlib.compress(data))
+            os.replace(tmp_path, path)
+        return sha
+
+    def get(self, sha):
+        """Returns the contents (bytes) of the blob with SHA sha"""
+        with open(self._path(sha), "rb") as file:
+            return zlib.decompress(file.read())
+
+    def add(self, repo_name, platform, path, sha):
+        """Records that path in repo_name, a config of platform, has the blob with SHA sha"""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (repo_name, platform, path, sha))
+            self._db.commit()
+
+    def files(self, repo_name):
+        """Returns [(platform, path, sha)] of the files of repo_name in the manifest"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT platform, path, sha FROM files WHERE repo = ? ORDER BY path", (repo_name,)
+            ).fetchall()
+
+    def close(self):
+        """Closes the manifest"""
+        with self._lock:
+            self._db.close()
+
+    def _path(self, sha):
+        return os.path.join(self.root, "blobs", sha[:2], sha)
+
+
+_DEFAULT_STORES = {}
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_store(root="out"):
+    """Returns the store in root that is shared by all modules of the process, created on first use"""
+    with _DEFAULT_LOCK:
+        if root not in _DEFAULT_STORES:
+            _DEFAULT_STORES[root] = BlobStore(root)
+        return _DEFAULT_STORES[root]
+
+
+def blob_sha(data):
+    """Returns the git blob SHA of data, the SHA that git trees and the contents API list for a file"""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
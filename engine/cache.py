@@ -0,0 +1,151 @@
+"""On-disk cache of GitHub API responses that revalidates with conditional requests"""
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from engine.http import HttpResponse
+
+
+class ResponseCache:
+    """
+    A request hook (see engine.http) that stores GET responses in a SQLite database together with
+    their ETag and Last-Modified headers. When a cached URL is requested again, the request is sent
+    with If-None-Match/If-Modified-Since; GitHub answers with 304 Not Modified when nothing changed,
+    which does not count against the rate limit, and the cached response is replayed.
+
+    Parameters
+    ----------
+    path : str
+        Path of the SQLite database
+    max_bytes : int
+        Upper bound of the size of all cached (compressed) bodies. The least recently used responses
+        are evicted first.
+
+    Attributes
+    ----------
+    hits : int
+        Number of requests answered from the cache after a 304
+    misses : int
+        Number of requests that were downloaded in full
+
+    Methods
+    -------
+    before_request(request)
+        Adds the conditional headers of a cached response to request
+    after_response(request, response)
+        Replays the cached response on a 304 and stores new cacheable responses
+    stats()
+        Returns the hit/miss counters and the size of the cache
+    close()
+        Closes the database
+    """
+
+    def __init__(self, path, max_bytes=1024 ** 3):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, headers TEXT,"
+            " body BLOB, size INTEGER, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def before_request(self, request):
+        """Makes request conditional when a response for it is cached"""
+        if request.verb != "GET":
+            return None
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified FROM responses WHERE key = ?", (self._key(request),)
+            ).fetchone()
+
+        if row is not None:
+            etag, last_modified = row
+            if etag:
+                request.headers["If-None-Match"] = etag
+            if last_modified:
+                request.headers["If-Modified-Since"] = last_modified
+        return None
+
+    def after_response(self, request, response):
+        """Replays the cached response on a 304 and stores cacheable 200 responses"""
+        if request.verb != "GET":
+            return response
+
+        key = self._key(request)
+        if response.status == 304:
+            cached = self._load(key)
+            if cached is not None:
+                headers, body = cached
+                # the fresh headers carry the current rate limit
+                headers.update(response.headers)
+                return HttpResponse(200, headers, body, from_cache=True)
+
+        with self._lock:
+            self.misses += 1
+        if response.status == 200 and ("etag" in response.headers or "last-modified" in response.headers):
+            self._store(key, response)
+        return response
+
+    def stats(self):
+        """Returns the hit and miss counters and the number and size of the cached responses"""
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'responses': count, 'bytes': self._size}
+
+    def close(self):
+        """Closes the database"""
+        with self._lock:
+            self._db.close()
+
+    def _key(self, request):
+        # The media type changes the representation that is returned, the token does not
+        return f"{request.url}\n{request.headers.get('Accept', '')}"
+
+    def _load(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT headers, body FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+        headers, body = row
+        return json.loads(headers), zlib.decompress(body).decode("utf-8")
+
+    def _store(self, key, response):
+        body = zlib.compress(response.text.encode("utf-8"))
+        with self._lock:
+            replaced = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._size += len(body) - (replaced[0] if replaced else 0)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, response.headers.get("etag"), response.headers.get("last-modified"),
+                 json.dumps(response.headers), body, len(body), time.time())
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_used")
+        evicted = []
+        for key, size in rows:
+            if self._size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.evictions += len(evicted)
@@ -0,0 +1,208 @@
+"""Cache of bare git mirrors of the mined repositories, reused and fetched incrementally across runs"""
+import collections
+import contextlib
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from git import Repo
+
+
+class CloneCache:  # pylint: disable=too-many-instance-attributes
+    """
+    Keeps a bare mirror of every repository in <root>/<owner>/<name>.git. The first use of a
+    repository clones it; later uses, also in later runs, only fetch the new commits, and a mirror
+    is fetched at most once per run. All clones and fetches run on a pool of `workers` threads, so
+    mining many repositories at once does not start an unbounded number of git processes.
+
+    Callers say what they need from a mirror. When they need neither the file contents (blobs) nor
+    the full history, the cache can save bytes and time with a blobless (--filter=blob:none) or
+    shallow (--depth) clone. A mirror that lacks something a later caller needs is completed on
+    demand: blobless mirrors are refetched with blobs, shallow ones are unshallowed.
+
+    When the mirrors take more than max_bytes on disk, the least recently used ones are deleted,
+    except those that are in use.
+
+    Parameters
+    ----------
+    root : str
+        The directory with the mirrors. It is created if it does not exist.
+    max_bytes : int
+        Maximum total size of the mirrors, or None for no limit
+    workers : int
+        Maximum number of clones and fetches that run at the same time
+    blobless : bool
+        Whether to clone without blobs when the caller does not need them
+    depth : int
+        Clone only this many commits when the caller does not need the history, or None for full
+        clones
+    verbose : bool
+        Whether or not to print what the cache does
+
+    Methods
+    -------
+    path(full_name)
+        Returns the directory of the mirror of a repository
+    submit(full_name, blobs, history)
+        Starts cloning or fetching a mirror on the pool
+    open(full_name, blobs, history)
+        Context manager that yields the up to date mirror as a git.Repo
+    export(full_name, directory)
+        Checks out the default branch of a repository into directory
+    evict()
+        Deletes least recently used mirrors until the cache fits max_bytes
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, root, max_bytes=None, workers=4, blobless=False, depth=None, verbose=False):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blobless = blobless
+        self.depth = depth
+        self.verbose = verbose
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._repo_locks = {}
+        self._fetched = set()
+        self._in_use = collections.Counter()
+        self._sizes = None
+
+    def path(self, full_name):
+        """Returns the directory of the mirror of full_name"""
+        return os.path.join(self.root, full_name + ".git")
+
+    def submit(self, full_name, blobs=True, history=True):
+        """
+        Starts bringing the mirror of full_name up to date on the pool and returns a Future of its
+        directory. blobs and history say whether the caller needs the file contents and the full
+        history.
+        """
+        return self._executor.submit(self._update, full_name, blobs, history)
+
+    @contextlib.contextmanager
+    def open(self, full_name, blobs=True, history=True):
+        """Yields the up to date mirror of full_name as a git.Repo, which is not evicted until the block ends"""
+        with self._lock:
+            self._in_use[full_name] += 1
+        try:
+            path = self.submit(full_name, blobs, history).result()
+            # the modification time of a mirror is its last use
+            os.utime(path)
+            yield Repo(path)
+        finally:
+            with self._lock:
+                self._in_use[full_name] -= 1
+            self.evict()
+
+    def export(self, full_name, directory):
+        """
+        Checks out the default branch of full_name into directory from the mirror, without going to
+        GitHub again. An existing checkout in directory is updated instead of failing.
+        """
+        with self.open(full_name, blobs=True, history=False) as mirror:
+            if os.path.isdir(os.path.join(directory, ".git")):
+                checkout = Repo(directory)
+                checkout.git.fetch(mirror.git_dir, "HEAD")
+                checkout.git.reset("--hard", "FETCH_HEAD")
+            else:
+                checkout = Repo.clone_from(mirror.git_dir, directory)
+                checkout.remote().set_url(_url(full_name))
+        return checkout
+
+    def evict(self):
+        """Deletes the least recently used mirrors that are not in use until the cache fits max_bytes"""
+        if self.max_bytes is None:
+            return
+
+        with self._lock:
+            if self._sizes is None:
+                self._sizes = {name: _disk_usage(self.path(name)) for name in self._mirrors()}
+            total = sum(self._sizes.values())
+            for name in sorted(self._sizes, key=lambda name: os.path.getmtime(self.path(name))):
+                if total <= self.max_bytes:
+                    break
+                # a mirror that is being fetched is locked, so it is skipped like the ones in use
+                lock = self._repo_lock(name)
+                if self._in_use[name] or not lock.acquire(blocking=False):
+                    continue
+                try:
+                    if self.verbose:
+                        print(f"Evicting the clone of {name}")
+                    shutil.rmtree(self.path(name), ignore_errors=True)
+                    total -= self._sizes.pop(name)
+                    self._fetched.discard(name)
+                finally:
+                    lock.release()
+
+    def _update(self, full_name, blobs, history):
+        path = self.path(full_name)
+        with self._repo_lock(full_name):
+            start_time = time.time()
+            if not os.path.isdir(path):
+                self._clone(full_name, path, blobs, history)
+            elif not self._fetch(full_name, Repo(path), blobs, history):
+                return path
+
+            with self._lock:
+                self._fetched.add(full_name)
+                if self._sizes is not None:
+                    self._sizes[full_name] = _disk_usage(path)
+            if self.verbose:
+                print(f"Updated the clone of {full_name} in {time.time() - start_time:.1f} seconds")
+        return path
+
+    def _clone(self, full_name, path, blobs, history):
+        options = ["--no-single-branch"]
+        if self.blobless and not blobs:
+            options.append("--filter=blob:none")
+        if self.depth and not history:
+            options.append(f"--depth={self.depth}")
+        Repo.clone_from(_url(full_name), path, bare=True, multi_options=options)
+
+    def _fetch(self, full_name, repo, blobs, history):
+        """Fetches what the mirror misses, and returns whether anything was fetched"""
+        args = []
+        with repo.config_reader() as config:
+            partial = config.has_option('remote "origin"', "partialclonefilter")
+        if blobs and partial:
+            # turn the blobless mirror into a full one
+            with repo.config_writer() as config:
+                config.remove_option('remote "origin"', "partialclonefilter")
+            args.append("--refetch")
+
+        shallow = os.path.exists(os.path.join(repo.git_dir, "shallow"))
+        if shallow and history:
+            args.append("--unshallow")
+
+        if full_name in self._fetched and not args:
+            return False
+        if shallow and not history:
+            # keep the mirror shallow, only moving it to the latest commits
+            args.append(f"--depth={self.depth or 1}")
+        repo.git.fetch("origin", "--prune", *args, "+refs/heads/*:refs/heads/*")
+        return True
+
+    def _repo_lock(self, full_name):
+        # setdefault is atomic, so all threads get the same lock
+        return self._repo_locks.setdefault(full_name, threading.Lock())
+
+    def _mirrors(self):
+        for owner in os.listdir(self.root):
+            if os.path.isdir(os.path.join(self.root, owner)):
+                for name in os.listdir(os.path.join(self.root, owner)):
+                    if name.endswith(".git"):
+                        yield f"{owner}/{name[:-len('.git')]}"
+
+
+def _url(full_name):
+    return f"https://github.com/{full_name}.git"
+
+
+def _disk_usage(path):
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, names in os.walk(path) for name in names
+    )
@@ -0,0 +1,220 @@
+"""
+Columnar output of the mined time series. Every table is a directory of NumPy .npy files, one per
+column, so that analysis can memory-map the columns and filter them without parsing JSON. Dates are
+stored as datetime64[s] (int64 seconds since the epoch, NaT when missing), repositories and workflow
+files as int32 codes into the lists in manifest.json.
+"""
+import datetime
+import email.utils
+import json
+import os
+
+import numpy as np
+
+from engine.output import iter_latest
+
+# Codes of the status column; -1 means that the commit did not change the file
+STATUSES = ['added', 'modified', 'removed', 'renamed', 'copied', 'changed', 'unchanged']
+
+_CHANGES = {'status': 'int8', 'additions': 'int32', 'deletions': 'int32', 'changes': 'int32'}
+
+# The columns of every table and their types
+SCHEMA = {
+    'commit_dates': {'repo': 'int32', 'date': 'datetime64[s]'},
+    'commit_meta': {'repo': 'int32', 'date': 'datetime64[s]', **_CHANGES},
+    'issues': {'repo': 'int32', 'created_at': 'datetime64[s]', 'closed_at': 'datetime64[s]'},
+    'releases': {'repo': 'int32', 'date': 'datetime64[s]'},
+    'workflow_commits': {'repo': 'int32', 'file': 'int32', 'date': 'datetime64[s]', **_CHANGES},
+}
+
+
+class ColumnarWriter:
+    """
+    Writes the time series of mined repositories to a directory of columnar tables (see SCHEMA).
+    The rows of every column are appended to a raw file as repositories are added, so memory does
+    not grow with the number of repositories; close() turns the raw files into .npy files and writes
+    the manifest.
+
+    Parameters
+    ----------
+    directory : str
+        The directory to write to. Tables that are already in it are replaced.
+
+    Methods
+    -------
+    add(repo_name, repo_info)
+        Appends the time series of one repository
+    close()
+        Writes the .npy files and the manifest
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.repos = []
+        self.files = {}
+        self.rows = dict.fromkeys(SCHEMA, 0)
+        self._raw = {}
+        for table, columns in SCHEMA.items():
+            os.makedirs(os.path.join(directory, table), exist_ok=True)
+            for column in columns:
+                # pylint: disable=consider-using-with
+                self._raw[table, column] = open(self._path(table, column) + ".raw", "wb")
+
+    def add(self, repo_name, repo_info):
+        """Appends the dates and changes in repo_info, as mined for repo_name"""
+        repo = len(self.repos)
+        self.repos.append(repo_name)
+        for table, columns in self._extract(repo_info).items():
+            rows = len(next(iter(columns.values())))
+            columns['repo'] = [repo] * rows
+            for column, dtype in SCHEMA[table].items():
+                values = columns[column]
+                array = _timestamps(values) if dtype.startswith('datetime64') else np.asarray(values, dtype=dtype)
+                self._raw[table, column].write(array.tobytes())
+            self.rows[table] += rows
+
+    def close(self):
+        """Turns the raw columns into .npy files and writes the manifest"""
+        for (table, column), raw in self._raw.items():
+            raw.close()
+            dtype = np.dtype(SCHEMA[table][column])
+            path = self._path(table, column)
+            values = np.memmap(raw.name, dtype=dtype, mode='r') if self.rows[table] else np.empty(0, dtype)
+            np.save(path + ".npy", values)
+            del values
+            os.remove(raw.name)
+
+        manifest = {
+            'repos': self.repos,
+            'files': list(self.files),
+            'statuses': STATUSES,
+            'tables': {
+                table: {'rows': self.rows[table], 'columns': columns} for table, columns in SCHEMA.items()
+            },
+        }
+        tmp_path = os.path.join(self.directory, "manifest.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file)
+        os.replace(tmp_path, os.path.join(self.directory, "manifest.json"))
+
+    def _path(self, table, column):
+        return os.path.join(self.directory, table, column)
+
+    def _extract(self, repo_info):
+        """Returns {table: {column: values}} with the rows of one repository"""
+        tables = {}
+
+        commits = repo_info.get('commits', {})
+        if commits.get('dates'):
+            tables['commit_dates'] = {'date': commits['dates']}
+        if commits.get('meta'):
+            tables['commit_meta'] = _changes(commits['meta'])
+
+        issues = repo_info.get('issues', {})
+        created, closed = issues.get('creation_dates'), issues.get('close_dates')
+        if created or closed:
+            rows = len(created or closed)
+            tables['issues'] = {'created_at': created or [None] * rows, 'closed_at': closed or [None] * rows}
+
+        releases = repo_info.get('releases', {})
+        if releases.get('dates'):
+            tables['releases'] = {'date': releases['dates']}
+
+        workflow_commits = [
+            (self.files.setdefault(file['path'], len(self.files)), commit)
+            for file in repo_info.get('workflow_files', []) for commit in file.get('commits', [])
+        ]
+        if workflow_commits:
+            changes = _changes([commit for _, commit in workflow_commits])
+            tables['workflow_commits'] = {'file': [code for code, _ in workflow_commits], **changes}
+        return tables
+
+
+class ColumnarDataset:
+    """
+    Reads the tables written by ColumnarWriter. Columns are memory-mapped, so opening a table costs
+    nothing and only the parts of the columns that are used are read from disk.
+
+    Parameters
+    ----------
+    directory : str
+        The directory written by ColumnarWriter
+
+    Attributes
+    ----------
+    repos : list
+        The repository names; the repo column holds indexes into this list
+    files : list
+        The workflow file paths; the file column holds indexes into this list
+    statuses : list
+        The file statuses; the status column holds indexes into this list, or -1
+
+    Methods
+    -------
+    table(name, columns)
+        Returns the columns of a table
+    rows(name)
+        Returns the number of rows of a table
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as file:
+            self.manifest = json.load(file)
+        self.repos = self.manifest['repos']
+        self.files = self.manifest['files']
+        self.statuses = self.manifest['statuses']
+
+    def table(self, name, columns=None):
+        """Returns {column: memory-mapped array} of table name, for all or only the given columns"""
+        columns = self.manifest['tables'][name]['columns'] if columns is None else columns
+        return {
+            column: np.load(os.path.join(self.directory, name, column + ".npy"), mmap_mode='r')
+            for column in columns
+        }
+
+    def rows(self, name):
+        """Returns the number of rows of table name"""
+        return self.manifest['tables'][name]['rows']
+
+
+def write_columnar(jsonl_path, directory):
+    """
+    Writes the most recent result of every repository in a JSONL output file to columnar tables in
+    directory, and returns the number of repositories
+    """
+    writer = ColumnarWriter(directory)
+    try:
+        for name, data in iter_latest(jsonl_path):
+            writer.add(name, data)
+    finally:
+        writer.close()
+    return len(writer.repos)
+
+
+def _changes(commits):
+    """Returns the date and file change columns of a list of commit meta (see CommitsModule)"""
+    files = [commit.get('file') or {} for commit in commits]
+    return {
+        'date': [_http_date(commit.get('date')) for commit in commits],
+        'status': [STATUSES.index(file['status']) if file.get('status') in STATUSES else -1 for file in files],
+        'additions': [file.get('additions', 0) for file in files],
+        'deletions': [file.get('deletions', 0) for file in files],
+        'changes': [file.get('changes', 0) for file in files],
+    }
+
+
+def _http_date(value):
+    """Turns a Last-Modified style date into a naive UTC datetime"""
+    if not value:
+        return None
+    date = email.utils.parsedate_to_datetime(value)
+    return date.astimezone(datetime.timezone.utc).replace(tzinfo=None) if date.tzinfo else date
+
+
+def _timestamps(values):
+    """
+    Converts datetimes, or the strings they were written as (default=str), to datetime64[s]. The
+    dates of the API are UTC, so a UTC offset in the string is dropped.
+    """
+    return np.array([str(value)[:19] if value else None for value in values], dtype='datetime64[s]')
@@ -0,0 +1,191 @@
+"""Rate limit governor driven by the rate limit headers of every response"""
+import dataclasses
+import datetime
+import email.utils
+import json
+import threading
+import time
+
+from engine.http import install_hook, wait
+from engine.tokens import TokenBudget
+
+# Seconds to wait after a secondary rate limit response that does not carry a Retry-After header
+SECONDARY_LIMIT_WAIT = 60
+
+
+@dataclasses.dataclass
+class _TokenState:
+    """Everything the governor knows about one token and rate limit resource"""
+    budget: TokenBudget = dataclasses.field(default_factory=TokenBudget)
+    next_slot: float = 0
+    blocked_until: float = 0
+    secondary_hits: int = 0
+
+
+class RateLimitGovernor:
+    """
+    A request hook (see engine.http) that keeps the primary rate limit budget of every token up to
+    date from the X-RateLimit-Remaining/-Limit/-Reset headers PyGithub already receives, instead of
+    polling /rate_limit. Requests are paced so that, once less than pace_below of the budget is left,
+    the rest of it is spread evenly over the time until the reset. When the budget reaches the
+    reserve, requests wait exactly until the reset time announced by GitHub.
+
+    Secondary (abuse) rate limits are handled separately: a 403/429 response with Retry-After or a
+    secondary rate limit message blocks all requests of that token for the announced time, after
+    which the request is retried. The time is taken from Retry-After (in seconds or as an HTTP date),
+    else from X-RateLimit-Reset when no requests are left, else it is SECONDARY_LIMIT_WAIT, doubled
+    every time the secondary limit is hit again.
+
+    Parameters
+    ----------
+    reserve : int
+        Number of requests that are never used, so that other tools sharing the token keep working
+    pace_below : float
+        Fraction of the limit below which requests are paced
+    verbose : bool
+        Whether or not to print when the governor waits
+
+    Methods
+    -------
+    before_request(request)
+        Waits until the request fits the budget of its token
+    after_response(request, response)
+        Updates the budget and detects rate limit responses
+    request_failed(request, exception)
+        Releases the slot of a request that could not be sent
+    remaining(resource)
+        Returns the remaining requests of the known budgets for resource
+    """
+
+    def __init__(self, reserve=100, pace_below=0.5, verbose=False):
+        self.reserve = reserve
+        self.pace_below = pace_below
+        self.verbose = verbose
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def before_request(self, request):
+        """Waits until request fits the budget of its token"""
+        with self._lock:
+            sleep_for = self._reserve_slot(self._state(request), time.time())
+
+        if sleep_for > 0:
+            if self.verbose and sleep_for > 10:
+                print(f"Rate limit: waiting {sleep_for / 60:.1f} minutes")
+            wait(request, sleep_for)
+
+    def after_response(self, request, response):
+        """Updates the budget of the token of request and retries rate limited requests"""
+        headers = response.headers
+        now = time.time()
+        with self._lock:
+            state = self._state(request)
+            state.budget.in_flight -= 1
+            state.budget.update(headers)
+
+            if response.status in (403, 429):
+                if self._is_secondary_limit(response):
+                    state.secondary_hits += 1
+                    retry_after = _secondary_wait(headers, now, state.secondary_hits)
+                    state.blocked_until = max(state.blocked_until, now + retry_after)
+                    request.context["retry"] = True
+                elif headers.get("x-ratelimit-remaining") == "0":
+                    # primary limit: before_request of the retry waits until the reset
+                    request.context["retry"] = True
+            elif response.status < 400:
+                state.secondary_hits = 0
+        return response
+
+    def request_failed(self, request, _exception):
+        """Releases the slot of a request that could not be sent"""
+        with self._lock:
+            self._state(request).budget.in_flight -= 1
+
+    def remaining(self, resource="core"):
+        """Returns the sum of the remaining requests of all known budgets for resource"""
+        with self._lock:
+            now = time.time()
+            return sum(
+                state.budget.headroom(now) for (_, state_resource), state in self._states.items()
+                if state_resource == resource
+            )
+
+    def _reserve_slot(self, state, now):
+        """Returns how long a request has to wait, and books its slot"""
+        wait_until = state.blocked_until
+
+        budget = state.budget
+        if budget.remaining is not None and now < budget.reset:
+            left = budget.remaining - budget.in_flight - self.reserve
+            if left <= 0:
+                # one second of margin for clock differences with GitHub
+                wait_until = max(wait_until, budget.reset + 1)
+            elif budget.remaining < self.pace_below * (budget.limit or 5000):
+                interval = (budget.reset - now) / left
+                slot = max(state.next_slot, now)
+                state.next_slot = slot + interval
+                wait_until = max(wait_until, slot)
+
+        budget.in_flight += 1
+        return wait_until - now
+
+    def _state(self, request):
+        key = request.headers.get("Authorization"), request.resource
+        return self._states.setdefault(key, _TokenState())
+
+    def _is_secondary_limit(self, response):
+        if "retry-after" in response.headers:
+            return True
+        try:
+            message = json.loads(response.text).get("message", "")
+        except (ValueError, AttributeError):
+            return False
+        return "secondary rate limit" in message.lower() or "abuse" in message.lower()
+
+
+def _secondary_wait(headers, now, hits):
+    """
+    Returns the seconds to wait after the hits-th secondary rate limit response in a row, as GitHub
+    documents it: Retry-After, which is either a number of seconds or an HTTP date; the reset time
+    when no requests are left; otherwise SECONDARY_LIMIT_WAIT, doubled on every further hit
+    """
+    retry_after = headers.get("retry-after")
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            pass
+        try:
+            date = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            date = None
+        if date is not None:
+            if date.tzinfo is None:
+                date = date.replace(tzinfo=datetime.timezone.utc)
+            return max(date.timestamp() - now, 0)
+    if headers.get("x-ratelimit-remaining") == "0":
+        try:
+            return max(float(headers.get("x-ratelimit-reset")) - now, 0)
+        except (TypeError, ValueError):
+            pass
+    return SECONDARY_LIMIT_WAIT * 2 ** (hits - 1)
+
+
+_DEFAULT_GOVERNORS = []
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_governor(verbose=False):
+    """
+    Returns the governor shared by all extractors of the process, installed as a request hook on
+    first use. Every installed governor paces every request, so installing one per extractor would
+    stack their waits.
+    """
+    with _DEFAULT_LOCK:
+        if not _DEFAULT_GOVERNORS:
+            governor = RateLimitGovernor(verbose=verbose)
+            install_hook(governor)
+            _DEFAULT_GOVERNORS.append(governor)
+        governor = _DEFAULT_GOVERNORS[0]
+        governor.verbose = governor.verbose or verbose
+        return governor
@@ -0,0 +1,117 @@
+"""Batched GraphQL fetching of the scalar metadata of many repositories at once"""
+import dataclasses
+import datetime
+import json
+import re
+import urllib.parse
+
+from github import GithubException
+from github.Consts import DEFAULT_BASE_URL
+
+from engine.http import requester_of
+
+# Aliased repository fields, one alias per repository in a batch. The keys produced from these fields
+# are the same as the ones of DescriptionModule, TopicsModule, RepositoryModule, PopularityModule
+# and SizeModule.
+REPOSITORY_METADATA_FRAGMENT = """
+fragment metadata on Repository {
+    description
+    createdAt
+    stargazerCount
+    forkCount
+    diskUsage
+    watchers { totalCount }
+    repositoryTopics(first: 100) { nodes { topic { name } } }
+}
+"""
+
+
+# Owner and name as GitHub allows them; anything else cannot be put into a query
+_REPO_NAME = re.compile(r"^[A-Za-z0-9_.-]+/[A-Za-z0-9_.-]+$")
+
+
+def graphql_url(base_url):
+    """
+    Returns the GraphQL endpoint that belongs to the REST API at base_url, as PyGithub's requester
+    expects it. On github.com (and on a stand-in without a path) it is /graphql next to the REST
+    API, but GitHub Enterprise serves REST under /api/v3 and GraphQL under /api/graphql.
+    """
+    parsed = urllib.parse.urlparse(base_url)
+    path = parsed.path.rstrip("/")
+    if path.endswith("/api/v3"):
+        return parsed._replace(path=path[:-len("/v3")] + "/graphql").geturl()
+    return "/graphql"
+
+
+@dataclasses.dataclass
+class RepositoryMetadataFetcher:
+    """
+    Fetches description, topics, creation date, popularity and size of many repositories with one
+    GraphQL query per batch, instead of several REST calls per repository.
+
+    Parameters
+    ----------
+    github : Github
+        Github client used to send the queries
+    batch_size : int
+        Number of repositories that are fetched with a single query
+    base_url : str
+        The REST API the client talks to, from which the GraphQL endpoint is derived
+
+    Methods
+    -------
+    fetch(repo_names)
+        Returns a dictionary mapping every found repository name to its metadata
+    """
+    github: object
+    batch_size: int = 50
+    base_url: str = DEFAULT_BASE_URL
+
+    def fetch(self, repo_names):
+        """
+        Fetches the metadata of repo_names in batches of self.batch_size. Repositories that cannot
+        be resolved (renamed, deleted or private), and names that are not of the form owner/name,
+        are left out of the result.
+        """
+        repo_names = [repo_name for repo_name in repo_names if _REPO_NAME.match(repo_name)]
+        metadata = {}
+        for start in range(0, len(repo_names), self.batch_size):
+            metadata.update(self._fetch_batch(repo_names[start:start + self.batch_size]))
+        return metadata
+
+    def _fetch_batch(self, repo_names):
+        _, response = requester_of(self.github).requestJsonAndCheck(
+            "POST", graphql_url(self.base_url), input={"query": self._build_query(repo_names)}
+        )
+        if response.get("data") is None:
+            raise GithubException(200, response, None)
+
+        metadata = {}
+        for index, repo_name in enumerate(repo_names):
+            node = response["data"].get(f"r{index}")
+            if node is not None:
+                metadata[repo_name] = self._to_module_output(node)
+        return metadata
+
+    def _build_query(self, repo_names):
+        aliases = []
+        for index, repo_name in enumerate(repo_names):
+            owner, name = repo_name.split("/", 1)
+            aliases.append(
+                f"r{index}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) {{ ...metadata }}"
+            )
+        return "query {\n" + "\n".join(aliases) + "\n}\n" + REPOSITORY_METADATA_FRAGMENT
+
+    def _to_module_output(self, node):
+        created_at = datetime.datetime.strptime(node["createdAt"], "%Y-%m-%dT%H:%M:%SZ")
+        return {
+            'description': node["description"] or "",
+            'topics': [topic["topic"]["name"] for topic in node["repositoryTopics"]["nodes"]],
+            'created_at': created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            'popularity': {
+                'star_count': node["stargazerCount"],
+                'watchers_count': node["watchers"]["totalCount"],
+                'forks_count': node["forkCount"],
+            },
+            'size': {'repos_size': node["diskUsage"]},
+        }
@@ -0,0 +1,186 @@
+"""
+Helpers for talking to the GitHub API through PyGithub.
+
+PyGithub sends every request through a connection object. This module replaces those connection
+classes with ones that pass each request through a chain of hooks, so that caching, token selection,
+rate limiting and instrumentation can be added without touching the modules. A hook implements
+
+    before_request(request) -> HttpResponse or None
+        Called before the request is sent. It may change request.headers, or answer the request
+        itself by returning a response, in which case the request is not sent.
+    after_response(request, response) -> HttpResponse
+        Called with the response, in reverse order of installation. It returns the response that is
+        handed to the next hook and finally to PyGithub.
+
+and optionally
+
+    request_failed(request, exception)
+        Called instead of after_response when sending the request raised an exception.
+
+A hook can ask for the request to be sent again (for example after waiting out a rate limit) by
+setting request.context["retry"] in after_response. A hook that waits before a request adds the
+seconds it waited to request.context["slept"] (see wait()), so that they can be told apart from the
+time the request itself took.
+"""
+import dataclasses
+import threading
+import time
+
+from github.Requester import HTTPRequestsConnectionClass, HTTPSRequestsConnectionClass, Requester
+
+_hooks = []
+_hooks_lock = threading.Lock()
+
+
+@dataclasses.dataclass
+class HttpRequest:
+    """
+    A request as PyGithub is about to send it. url is the path and query string. Hooks can keep
+    per-request state in context between before_request and after_response.
+    """
+    verb: str
+    url: str
+    headers: dict
+    body: object = None
+    context: dict = dataclasses.field(default_factory=dict)
+
+    @property
+    def resource(self):
+        """The rate limit resource the request counts against"""
+        if self.url.startswith("/graphql"):
+            return "graphql"
+        if self.url.startswith("/search"):
+            return "search"
+        return "core"
+
+
+class HttpResponse:
+    """A response that mimics the response objects PyGithub reads from its connections"""
+
+    def __init__(self, status, headers, text, from_cache=False):
+        self.status = status
+        self.headers = {key.lower(): value for key, value in headers.items()}
+        self.text = text
+        self.from_cache = from_cache
+
+    def getheaders(self):
+        """Returns the headers as (name, value) pairs"""
+        return self.headers.items()
+
+    def read(self):
+        """Returns the body of the response"""
+        return self.text
+
+
+def install_hook(hook):
+    """Adds a hook to the end of the chain, closest to the network"""
+    with _hooks_lock:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """Removes a previously installed hook"""
+    with _hooks_lock:
+        _hooks.remove(hook)
+
+
+def wait(request, seconds):
+    """Sleeps for seconds before sending request, and adds them to request.context["slept"]"""
+    time.sleep(seconds)
+    request.context["slept"] = request.context.get("slept", 0) + seconds
+
+
+MAX_ATTEMPTS = 5
+
+
+def dispatch(request, send):
+    """
+    Passes request through the installed hooks. send(request) performs the actual request and is
+    only called when no hook answered the request itself. The request is sent again, up to
+    MAX_ATTEMPTS times, as long as a hook asks for a retry.
+    """
+    with _hooks_lock:
+        hooks = list(_hooks)
+
+    for _ in range(MAX_ATTEMPTS):
+        response = _dispatch_once(hooks, request, send)
+        if not request.context.pop("retry", False):
+            break
+    return response
+
+
+def _dispatch_once(hooks, request, send):
+    response = None
+    answered_by = len(hooks)
+    for index, hook in enumerate(hooks):
+        response = hook.before_request(request)
+        if response is not None:
+            answered_by = index
+            break
+
+    if response is None:
+        try:
+            response = send(request)
+        except Exception as exception:
+            for hook in reversed(hooks):
+                if hasattr(hook, "request_failed"):
+                    hook.request_failed(request, exception)
+            raise
+
+    # only the hooks that saw the request see its response
+    for hook in reversed(hooks[:answered_by]):
+        response = hook.after_response(request, response)
+    return response
+
+
+class _HookedConnectionMixin:
+    """
+    Runs the requests of a PyGithub connection through dispatch. PyGithub stores the pending request
+    on the connection object, which is shared by everything that uses the same client; the mixin
+    keeps it per thread instead, so that a client can be used from several threads at once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = threading.local()
+
+    def request(self, verb, url, input, headers):  # pylint: disable=redefined-builtin
+        """Stores the request of the calling thread until getresponse is called"""
+        self._pending.request = HttpRequest(verb, url, dict(headers), input)
+
+    def getresponse(self):
+        """Sends the pending request of the calling thread through the hooks and returns the response"""
+        return dispatch(self._pending.request, self._send)
+
+    def _send(self, request):
+        response = self.session.request(
+            request.verb,
+            f"{self.protocol}://{self.host}:{self.port}{request.url}",
+            headers=request.headers,
+            data=request.body,
+            timeout=self.timeout,
+            verify=self.verify,
+            allow_redirects=False,
+        )
+        return HttpResponse(response.status_code, dict(response.headers), response.text)
+
+
+class HookedHTTPSConnection(_HookedConnectionMixin, HTTPSRequestsConnectionClass):
+    """HTTPS connection of PyGithub that runs the installed hooks"""
+
+
+class HookedHTTPConnection(_HookedConnectionMixin, HTTPRequestsConnectionClass):
+    """HTTP connection of PyGithub that runs the installed hooks"""
+
+
+# Github clients pick their connection class when they are created, so the hooked classes are
+# injected as soon as this module is imported.
+Requester.injectConnectionClasses(HookedHTTPConnection, HookedHTTPSConnection)
+
+
+def requester_of(github):
+    """
+    Returns the Requester of a Github client. PyGithub does not expose it, but it is the only way to
+    send requests (such as GraphQL queries) that go through the same connection as all other calls.
+    """
+    return github._Github__requester  # pylint: disable=protected-access
@@ -0,0 +1,169 @@
+"""
+Descriptive metrics of all mined repositories at once, computed with NumPy from the columnar
+tables (see engine.columnar). Every metric is computed for all repositories with a few sorts and
+reductions over whole columns instead of loops over the repositories.
+"""
+import json
+import math
+
+import numpy as np
+
+from engine.columnar import ColumnarDataset
+
+SECONDS_PER_DAY = 24 * 60 * 60
+DAYS_PER_WEEK = 7
+DAYS_PER_MONTH = 365.25 / 12
+
+
+def commit_frequency(dataset):
+    """
+    Returns {'commits': ..., 'commits_per_week': ...}, arrays indexed like dataset.repos. The number
+    of commits is divided by the number of weeks between the first and the last commit (at least
+    one week).
+    """
+    table = dataset.table('commit_dates')
+    repo, days = _valid_days(table['repo'], table['date'])
+    days, starts, counts = _sort_by_group(repo, days, len(dataset.repos))
+
+    first, last = _first_last(days, starts, counts)
+    weeks = np.maximum((last - first) / DAYS_PER_WEEK, 1)
+    return {'commits': counts, 'commits_per_week': counts / weeks}
+
+
+def issue_time_to_close(dataset, percentiles=(50, 90)):
+    """
+    Returns {'closed_issues': ..., 'issue_close_days_p<q>': ...} for every q in percentiles: the
+    number of closed issues and percentiles of the days from their creation until they were closed
+    """
+    table = dataset.table('issues')
+    closed = ~np.isnat(table['closed_at']) & ~np.isnat(table['created_at'])
+    durations = (table['closed_at'][closed] - table['created_at'][closed]).astype('int64') / SECONDS_PER_DAY
+    durations, starts, counts = _sort_by_group(table['repo'][closed], durations, len(dataset.repos))
+
+    metrics = {'closed_issues': counts}
+    for percentile in percentiles:
+        metrics[f'issue_close_days_p{percentile}'] = _percentile(durations, starts, counts, percentile / 100)
+    return metrics
+
+
+def release_cadence(dataset):
+    """
+    Returns {'releases': ..., 'release_interval_days_median': ...}: the number of releases and the
+    median number of days between consecutive releases
+    """
+    table = dataset.table('releases')
+    repo, days = _valid_days(table['repo'], table['date'])
+    days, _, counts = _sort_by_group(repo, days, len(dataset.repos))
+
+    # intervals between consecutive releases of the same repository
+    groups = np.repeat(np.arange(len(dataset.repos)), counts)
+    same_repo = groups[1:] == groups[:-1]
+    intervals, interval_starts, interval_counts = _sort_by_group(
+        groups[1:][same_repo], np.diff(days)[same_repo], len(dataset.repos)
+    )
+    return {
+        'releases': counts,
+        'release_interval_days_median': _percentile(intervals, interval_starts, interval_counts, 0.5),
+    }
+
+
+def ci_config_churn(dataset):
+    """
+    Returns the churn of every workflow file that has commits, as {'repo': ..., 'file': ...,
+    'commits': ..., 'changes': ..., 'commits_per_month': ..., 'changes_per_month': ...}. The rates
+    are per month between the first and the last commit of the file (at least one month).
+    """
+    table = dataset.table('workflow_commits')
+    valid = ~np.isnat(table['date'])
+    keys = table['repo'][valid].astype('int64') * max(len(dataset.files), 1) + table['file'][valid]
+    keys, groups = np.unique(keys, return_inverse=True)
+    days = table['date'][valid].astype('int64') / SECONDS_PER_DAY
+
+    sorted_days, starts, counts = _sort_by_group(groups, days, len(keys))
+    first, last = _first_last(sorted_days, starts, counts)
+    months = np.maximum((last - first) / DAYS_PER_MONTH, 1)
+    changes = np.bincount(groups, weights=table['changes'][valid], minlength=len(keys)).astype('int64')
+    return {
+        'repo': keys // max(len(dataset.files), 1),
+        'file': keys % max(len(dataset.files), 1),
+        'commits': counts,
+        'changes': changes,
+        'commits_per_month': counts / months,
+        'changes_per_month': changes / months,
+    }
+
+
+def compute_metrics(dataset):
+    """
+    Returns {repo name: metrics} with all metrics of every repository in dataset. Metrics that
+    cannot be computed (such as percentiles without closed issues) are None.
+    """
+    per_repo = {
+        **commit_frequency(dataset),
+        **issue_time_to_close(dataset),
+        **release_cadence(dataset),
+    }
+    columns = {name: values.tolist() for name, values in per_repo.items()}
+    metrics = {
+        name: {metric: _json_number(values[index]) for metric, values in columns.items()}
+        for index, name in enumerate(dataset.repos)
+    }
+
+    churn = {name: values.tolist() for name, values in ci_config_churn(dataset).items()}
+    for index, repo in enumerate(churn['repo']):
+        files = metrics[dataset.repos[repo]].setdefault('ci_config_churn', {})
+        files[dataset.files[churn['file'][index]]] = {
+            metric: _json_number(churn[metric][index])
+            for metric in ('commits', 'changes', 'commits_per_month', 'changes_per_month')
+        }
+    return metrics
+
+
+def write_metrics(directory, json_path):
+    """Computes the metrics of the columnar tables in directory, writes them to json_path and returns their number"""
+    metrics = compute_metrics(ColumnarDataset(directory))
+    with open(json_path, "w", encoding="utf-8") as file:
+        json.dump(metrics, file, indent=3)
+    return len(metrics)
+
+
+def _valid_days(repo, dates):
+    """Returns the repo codes and the dates in days since the epoch of the rows that have a date"""
+    valid = ~np.isnat(dates)
+    return repo[valid], dates[valid].astype('int64') / SECONDS_PER_DAY
+
+
+def _sort_by_group(groups, values, group_count):
+    """
+    Sorts values by group and then by value, and returns them with the index of the first value of
+    every group and the number of values of every group
+    """
+    order = np.lexsort((values, groups))
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return values[order], starts, counts
+
+
+def _first_last(values, starts, counts):
+    """Returns the smallest and largest sorted value of every group, NaN for empty groups"""
+    first = np.full(len(counts), np.nan)
+    last = np.full(len(counts), np.nan)
+    present = counts > 0
+    first[present] = values[starts[present]]
+    last[present] = values[starts[present] + counts[present] - 1]
+    return first, last
+
+
+def _percentile(values, starts, counts, quantile):
+    """Returns the quantile of the sorted values of every group, interpolated like np.percentile"""
+    result = np.full(len(counts), np.nan)
+    present = counts > 0
+    position = starts[present] + quantile * (counts[present] - 1)
+    lower = np.floor(position).astype('int64')
+    upper = np.ceil(position).astype('int64')
+    result[present] = values[lower] + (values[upper] - values[lower]) * (position - lower)
+    return result
+
+
+def _json_number(value):
+    return None if isinstance(value, float) and math.isnan(value) else value
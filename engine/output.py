@@ -0,0 +1,145 @@
+"""Append-only output of mined repositories, written one repository at a time"""
+import datetime
+import itertools
+import json
+import os
+import threading
+
+
+class JsonlWriter:
+    """
+    Appends every mined repository as one JSON line to a file as soon as it is mined. Each line is
+    flushed and synced to disk before write returns, so a crash loses at most the repository that
+    was being written, and memory does not grow with the number of mined repositories.
+
+    A line has the form {"name": <repo name>, "mined_at": <ISO timestamp>, "data": <repo info>}.
+
+    Parameters
+    ----------
+    path : str
+        The file to append to. It is created if it does not exist.
+
+    Methods
+    -------
+    write(repo_name, repo_info)
+        Appends the information of one repository
+    close()
+        Closes the file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")  # pylint: disable=consider-using-with
+
+    def write(self, repo_name, repo_info):
+        """Appends repo_info as the latest result for repo_name"""
+        line = json.dumps({
+            'name': repo_name,
+            'mined_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'data': repo_info,
+        }, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """Closes the file"""
+        with self._lock:
+            self._file.close()
+
+
+def iter_records(path):
+    """
+    Yields (offset, record) for every complete line of a JSONL output file. A line that was cut off
+    by a crash is skipped.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as file:
+        offset = file.tell()
+        for line in file:
+            try:
+                yield offset, json.loads(line)
+            except ValueError:
+                pass
+            offset += len(line)
+
+
+def read_mined_repos(path):
+    """
+    Returns the names of the repositories that are mined completely in a JSONL output file. A record
+    with module_errors (modules that failed, whether they are retried or not) does not count, so
+    that the repository is mined again.
+    """
+    return {record['name'] for _, record in iter_records(path) if not record['data'].get('module_errors')}
+
+
+def iter_latest(jsonl_path):
+    """
+    Yields (repo name, repo info) of the most recent record of every repository in a JSONL output
+    file. Only the offsets of the records are held in memory; the records are read one by one.
+    """
+    latest = {}
+    for offset, record in iter_records(jsonl_path):
+        if record['name'] not in latest or record['mined_at'] >= latest[record['name']][0]:
+            latest[record['name']] = (record['mined_at'], offset)
+
+    with open(jsonl_path, "rb") as source:
+        for name, (_, offset) in latest.items():
+            source.seek(offset)
+            yield name, json.loads(source.readline())['data']
+
+
+def merge(jsonl_paths, output_path):
+    """
+    Merges the JSONL output files of several shards (or runs) into one JSONL output file with one
+    record per repository. When a repository is in more than one file, the record with the latest
+    mined_at is kept, the one in the later file on a tie. Only the mining timestamp and the position
+    of every record are held in memory; the kept records are copied line by line, file by file.
+
+    Returns (number of repositories written, number of records dropped as older duplicates).
+    """
+    latest = {}
+    records = 0
+    for source_index, path in enumerate(jsonl_paths):
+        for offset, record in iter_records(path):
+            records += 1
+            if record['name'] not in latest or record['mined_at'] >= latest[record['name']][0]:
+                latest[record['name']] = (record['mined_at'], source_index, offset)
+
+    # copy the records in file and offset order, so every source is read front to back once
+    positions = sorted((source_index, offset) for _, source_index, offset in latest.values())
+    del latest
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as target:
+        for source_index, group in itertools.groupby(positions, key=lambda position: position[0]):
+            with open(jsonl_paths[source_index], "rb") as source:
+                for _, offset in group:
+                    source.seek(offset)
+                    line = source.readline()
+                    target.write(line if line.endswith(b"\n") else line + b"\n")
+    # replace the old file only once the new one is complete, so an input can also be the output
+    os.replace(tmp_path, output_path)
+    return len(positions), records - len(positions)
+
+
+def compact(jsonl_path, json_path):
+    """
+    Turns a JSONL output file into the single JSON object format, {repo name: repo info}, written
+    with indent=3. When a repository was mined more than once, the most recent result is kept. The
+    records are streamed to the output one by one.
+    """
+    count = 0
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as target:
+        target.write("{")
+        for name, data in iter_latest(jsonl_path):
+            value = json.dumps(data, indent=3, default=str).replace("\n", "\n   ")
+            target.write(("," if count else "") + f"\n   {json.dumps(name)}: {value}")
+            count += 1
+        target.write("\n}" if count else "}")
+    # replace the old file only once the new one is complete
+    os.replace(tmp_path, json_path)
+    return count
@@ -0,0 +1,199 @@
+"""
+Instrumentation of a mining run: which repository, module and param every API request was made for,
+how many bytes it received, how long it took, how long it waited for the rate limit and whether it
+was answered from the response cache.
+"""
+import collections
+import contextlib
+import contextvars
+import json
+import threading
+import time
+
+# The labels (repo, module, param) of the code that is running, set with profile()
+_labels: contextvars.ContextVar = contextvars.ContextVar("profile_labels", default=None)
+
+_profilers = []
+_profilers_lock = threading.Lock()
+
+LABELS = ('repo', 'module', 'param')
+_COUNTERS = ('requests', 'cache_hits', 'errors', 'bytes', 'request_seconds', 'sleep_seconds', 'wall_seconds')
+
+
+@contextlib.contextmanager
+def profile(**labels):
+    """
+    Attributes the requests made inside the block (in this thread, or in tasks that run in a copy
+    of its context) to labels, which are added to the labels of the enclosing blocks. The block
+    itself is recorded as a span by every running Profiler.
+    """
+    merged = {**(_labels.get() or {}), **labels}
+    token = _labels.set(merged)
+    start = time.time()
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+        with _profilers_lock:
+            profilers = list(_profilers)
+        for profiler in profilers:
+            profiler.span(merged, start, time.time())
+
+
+class Profiler:
+    """
+    A request hook (see engine.http) that records every API request together with the labels of the
+    profile() blocks it was made in. Install it before all other hooks, so that it sees the time the
+    other hooks wait for the rate limit and the responses they replay from the cache.
+
+    Every request and every profile() block is written to a trace file as it finishes. When the
+    path ends with .json the trace is in the Chrome trace event format (open it in
+    chrome://tracing or https://ui.perfetto.dev), otherwise it is JSONL. When the profiler is
+    closed, the totals per repository, module and param are appended to a JSONL trace.
+
+    Parameters
+    ----------
+    path : str
+        The trace file, or None to only keep the totals
+
+    Methods
+    -------
+    before_request(request)
+        Notes the start of a request
+    after_response(request, response)
+        Records a request
+    request_failed(request, exception)
+        Records a request that could not be sent
+    span(labels, start, end)
+        Records a profile() block
+    totals()
+        Returns the totals per repository, module and param
+    summary()
+        Returns the totals per module and param as a table
+    close()
+        Finishes the trace file and stops recording
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.chrome = path is not None and path.endswith(".json")
+        self._totals = collections.defaultdict(lambda: dict.fromkeys(_COUNTERS, 0))
+        self._lock = threading.Lock()
+        self._events = 0
+        self._file = None
+        if path is not None:
+            self._file = open(path, "w", encoding="utf-8")  # pylint: disable=consider-using-with
+            if self.chrome:
+                self._file.write("[\n")
+        with _profilers_lock:
+            _profilers.append(self)
+
+    def before_request(self, request):
+        """Notes when the request started and how long it had waited before"""
+        request.context["profile_start"] = time.time()
+        request.context["profile_slept"] = request.context.get("slept", 0)
+
+    def after_response(self, request, response):
+        """Records the request and its response"""
+        from_cache = getattr(response, "from_cache", False)
+        received = 0
+        if not from_cache:
+            received = int(response.headers.get("content-length") or len((response.text or "").encode("utf-8")))
+        self._record(request, status=response.status, received=received, from_cache=from_cache)
+        return response
+
+    def request_failed(self, request, exception):
+        """Records a request that raised exception"""
+        self._record(request, status=None, received=0, from_cache=False, error=type(exception).__name__)
+
+    def span(self, labels, start, end):
+        """Records a profile() block with labels that ran from start to end"""
+        key = _key(labels)
+        with self._lock:
+            # the time of a block includes the blocks nested in it, which have more labels
+            self._totals[key]['wall_seconds'] += end - start
+            self._write({
+                'type': 'span', **labels, 'start': start, 'seconds': end - start,
+            }, name=key[2] or key[1] or key[0] or 'run', category='span', start=start, seconds=end - start)
+
+    def totals(self):
+        """Returns [{'repo': ..., 'module': ..., 'param': ..., counters...}] for every labels seen"""
+        with self._lock:
+            return [dict(zip(LABELS, key), **counters) for key, counters in self._totals.items()]
+
+    def summary(self):
+        """Returns the totals per module and param, summed over the repositories, as a text table"""
+        rows = collections.defaultdict(lambda: dict.fromkeys(_COUNTERS, 0))
+        for total in self.totals():
+            row = rows[total['module'] or '-', total['param'] or '-']
+            for counter in _COUNTERS:
+                row[counter] += total[counter]
+
+        header = f"{'module':<28}{'param':<24}{'requests':>10}{'cached':>8}{'errors':>8}{'MB':>10}" \
+                 f"{'request s':>11}{'sleep s':>10}{'wall s':>10}"
+        lines = [header, "-" * len(header)]
+        for (module, param), row in sorted(rows.items(), key=lambda item: -item[1]['requests']):
+            lines.append(
+                f"{module:<28.28}{param:<24.24}{row['requests']:>10}{row['cache_hits']:>8}{row['errors']:>8}"
+                f"{row['bytes'] / 1024 ** 2:>10.2f}{row['request_seconds']:>11.1f}{row['sleep_seconds']:>10.1f}"
+                f"{row['wall_seconds']:>10.1f}"
+            )
+        return "\n".join(lines)
+
+    def close(self):
+        """Writes the totals to a JSONL trace, closes the trace file and stops recording"""
+        with _profilers_lock:
+            if self in _profilers:
+                _profilers.remove(self)
+        with self._lock:
+            if self._file is None:
+                return
+            if self.chrome:
+                self._file.write("\n]\n")
+            else:
+                for key, counters in self._totals.items():
+                    self._file.write(json.dumps({'type': 'total', **dict(zip(LABELS, key)), **counters}) + "\n")
+            self._file.close()
+            self._file = None
+
+    def _record(self, request, status, received, from_cache, error=None):  # pylint: disable=too-many-arguments
+        end = time.time()
+        start = request.context.pop("profile_start", end)
+        slept = request.context.get("slept", 0) - request.context.pop("profile_slept", 0)
+        labels = _labels.get() or {}
+        with self._lock:
+            counters = self._totals[_key(labels)]
+            counters['requests'] += 1
+            counters['cache_hits'] += bool(from_cache)
+            counters['errors'] += error is not None or (status is not None and status >= 400)
+            counters['bytes'] += received
+            counters['request_seconds'] += end - start
+            counters['sleep_seconds'] += slept
+            event = {
+                'type': 'request', **labels, 'verb': request.verb, 'url': request.url, 'status': status,
+                'bytes': received, 'from_cache': bool(from_cache), 'start': start, 'seconds': end - start,
+                'sleep_seconds': slept,
+            }
+            if error is not None:
+                event['error'] = error
+            self._write(event, name=f"{request.verb} {request.url}", category='request', start=start,
+                        seconds=end - start)
+
+    def _write(self, event, name, category, start, seconds):  # pylint: disable=too-many-arguments
+        """Writes event to the trace; must be called with self._lock held"""
+        if self._file is None:
+            return
+        if self.chrome:
+            event = {
+                'name': name, 'cat': category, 'ph': 'X', 'ts': int(start * 1e6), 'dur': int(seconds * 1e6),
+                'pid': 1, 'tid': threading.get_ident(),
+                'args': {key: value for key, value in event.items() if key not in ('type', 'start', 'seconds')},
+            }
+            self._file.write(("" if self._events == 0 else ",\n") + json.dumps(event))
+        else:
+            self._file.write(json.dumps(event) + "\n")
+        self._events += 1
+
+
+def _key(labels):
+    return tuple(labels.get(label) for label in LABELS)
@@ -0,0 +1,32 @@
+"""Deterministic partitioning of the repositories to mine over several machines"""
+import argparse
+import hashlib
+
+
+def parse_shard(value):
+    """
+    Parses a shard given as "i/N" on the command line into (i, N), where 0 <= i < N. Raises
+    argparse.ArgumentTypeError when value is not of that form.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(f"a shard has the form i/N, not {value!r}") from error
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard {value!r} must have 0 <= i < N")
+    return index, count
+
+
+def shard_of(repo_name, count):
+    """
+    Returns the shard (0 to count - 1) of repo_name. It only depends on the name, compared
+    case-insensitively like GitHub does, so a repository stays in the same shard across reruns,
+    machines and Python versions, and whatever the order of the list of repositories.
+    """
+    digest = hashlib.sha1(repo_name.strip().lower().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def select_shard(repo_names, index, count):
+    """Returns the names in repo_names that belong to shard index of count, in their original order"""
+    return [name for name in repo_names if shard_of(name, count) == index]
@@ -0,0 +1,136 @@
+"""Pool of GitHub access tokens that routes every request to the token with the most budget left"""
+import dataclasses
+import threading
+import time
+
+from engine.http import wait
+
+
+@dataclasses.dataclass
+class TokenBudget:
+    """
+    The rate limit budget of one token for one resource (core, graphql or search), as reported by
+    the X-RateLimit headers of the last response. remaining is None until the first response.
+    """
+    remaining: int = None
+    limit: int = None
+    reset: float = 0
+    in_flight: int = 0
+
+    def update(self, headers):
+        """Updates the budget from the (lower case) X-RateLimit headers of a response"""
+        if "x-ratelimit-remaining" in headers:
+            self.remaining = int(headers["x-ratelimit-remaining"])
+            self.limit = int(headers.get("x-ratelimit-limit", self.limit or 5000))
+            self.reset = float(headers.get("x-ratelimit-reset", self.reset))
+
+    def headroom(self, now):
+        """Number of requests that can still be sent with this budget"""
+        if self.remaining is None or now >= self.reset:
+            # unknown, or the window has been reset since the last response
+            return (self.limit or 5000) - self.in_flight
+        return self.remaining - self.in_flight
+
+
+class TokenPool:
+    """
+    A request hook (see engine.http) that authenticates every request with the token that has the
+    most requests left for the resource of the request. The budgets are kept up to date from the
+    X-RateLimit headers of every response, so no extra calls are needed. The pool only sleeps when
+    every token is below the threshold, and then only until the earliest reset.
+
+    Parameters
+    ----------
+    tokens : list
+        The access tokens
+    threshold : int
+        Number of requests a token keeps in reserve before it is considered exhausted
+    verbose : bool
+        Whether or not to print when the pool has to wait
+
+    Methods
+    -------
+    before_request(request)
+        Authenticates request with the token with the most headroom, waiting if all are exhausted
+    after_response(request, response)
+        Updates the budget of the token that was used from the response headers
+    request_failed(request, exception)
+        Releases the token of a request that could not be sent
+    wait_time(resource)
+        Returns the number of seconds until a token has budget for resource again
+    budgets()
+        Returns a snapshot of all budgets
+    """
+
+    def __init__(self, tokens, threshold=100, verbose=False):
+        if not tokens:
+            raise ValueError("TokenPool needs at least one token")
+        self.tokens = list(tokens)
+        self.threshold = threshold
+        self.verbose = verbose
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def before_request(self, request):
+        """Picks a token for request"""
+        while True:
+            with self._lock:
+                token, budget = self._best_token(request.resource)
+                if budget.headroom(time.time()) > self.threshold:
+                    budget.in_flight += 1
+                    break
+                sleep_for = max(budget.reset - time.time(), 0) + 1
+
+            if self.verbose:
+                print(f"All tokens exhausted, sleeping for {sleep_for / 60:.1f} minutes")
+            wait(request, sleep_for)
+
+        request.headers["Authorization"] = f"token {token}"
+        request.context["token"] = token
+
+    def after_response(self, request, response):
+        """Updates the budget of the token used for request"""
+        token = request.context.get("token")
+        if token is None:
+            return response
+
+        resource = response.headers.get("x-ratelimit-resource", request.resource)
+        with self._lock:
+            self._budget(token, request.resource).in_flight -= 1
+            self._budget(token, resource).update(response.headers)
+        return response
+
+    def request_failed(self, request, _exception):
+        """Releases the token of a request that could not be sent"""
+        token = request.context.get("token")
+        if token is not None:
+            with self._lock:
+                self._budget(token, request.resource).in_flight -= 1
+
+    def wait_time(self, resource="core"):
+        """Returns the number of seconds until some token has budget for resource again"""
+        with self._lock:
+            _, budget = self._best_token(resource)
+            if budget.headroom(time.time()) > self.threshold:
+                return 0
+            return max(budget.reset - time.time(), 0)
+
+    def budgets(self):
+        """Returns a copy of the budgets, keyed by (token index, resource)"""
+        with self._lock:
+            return {
+                (self.tokens.index(token), resource): dataclasses.replace(budget)
+                for (token, resource), budget in self._budgets.items()
+            }
+
+    def _budget(self, token, resource):
+        return self._budgets.setdefault((token, resource), TokenBudget())
+
+    def _best_token(self, resource):
+        now = time.time()
+        budgets = [(token, self._budget(token, resource)) for token in self.tokens]
+        usable = [(token, budget) for token, budget in budgets if budget.headroom(now) > self.threshold]
+        if usable:
+            return max(usable, key=lambda item: item[1].headroom(now))
+        # every token is exhausted: the one that resets first is the best one to wait for
+        return min(budgets, key=lambda item: item[1].reset)
@@ -0,0 +1,73 @@
+"""Per repository state of incremental mining, kept between runs"""
+import json
+import pickle
+import sqlite3
+import threading
+import zlib
+
+
+class WatermarkStore:
+    """
+    Stores, per repository and module, the watermark of the newest item mined so far (such as the
+    date of the newest commit or the latest updated_at of the issues) together with the extracted
+    values of all items, in a SQLite database. On the next run a module only fetches the items past
+    its watermark and merges them into the stored items, instead of mining the whole history again.
+
+    The state is tied to the extracted values: when a module is run with other params than the
+    stored state was made with, the state is ignored and the module mines everything again.
+
+    Parameters
+    ----------
+    path : str
+        Path of the SQLite database
+
+    Methods
+    -------
+    load(repo_name, module, params)
+        Returns the watermark and items of a module for a repository
+    save(repo_name, module, params, watermark, items)
+        Replaces the watermark and items of a module for a repository
+    close()
+        Closes the database
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            " repo TEXT, module TEXT, params TEXT, watermark BLOB, items BLOB,"
+            " PRIMARY KEY (repo, module))"
+        )
+        self._db.commit()
+
+    def load(self, repo_name, module, params):
+        """
+        Returns (watermark, items) stored for module of repo_name, or (None, None) if nothing was
+        stored or the state was made with other params
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT params, watermark, items FROM watermarks WHERE repo = ? AND module = ?",
+                (repo_name, module)
+            ).fetchone()
+
+        if row is None or row[0] != json.dumps(params):
+            return None, None
+        # the values are pickled to keep their types (such as datetime) across runs
+        return pickle.loads(row[1]), pickle.loads(zlib.decompress(row[2]))
+
+    def save(self, repo_name, module, params, watermark, items):  # pylint: disable=too-many-arguments
+        """Stores the watermark and items of module for repo_name"""
+        row = (
+            repo_name, module, json.dumps(params), pickle.dumps(watermark),
+            zlib.compress(pickle.dumps(items)),
+        )
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?, ?)", row)
+            self._db.commit()
+
+    def close(self):
+        """Closes the database"""
+        with self._lock:
+            self._db.close()
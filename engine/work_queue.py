@@ -0,0 +1,230 @@
+"""Persistent queue of the repositories of a crawl, with retries of transient failures"""
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+from github.GithubException import GithubException, RateLimitExceededException
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+
+class WorkQueue:
+    """
+    Keeps the state of every repository of a crawl in a SQLite database: pending, in_progress,
+    done or failed, with the number of attempts and the last error. A repository that failed with
+    a transient error (see is_transient) is retried after an exponential backoff with jitter, up to
+    max_attempts times. A repository that failed with any other error, or ran out of attempts, is a
+    dead letter: it stays failed until requeue_dead is called.
+
+    When only some modules of a repository failed, the queue keeps the output of the other modules
+    and the names of the failed ones, so that the retry only mines the failed modules again.
+
+    With a database file, a crawl that is stopped or crashes continues where it left off: done
+    repositories are not mined again and repositories that were in progress are pending again.
+
+    Parameters
+    ----------
+    path : str
+        Path of the SQLite database, or ":memory:" for a queue that only lives as long as the run
+    max_attempts : int
+        Number of times a repository is mined before it becomes a dead letter
+    base_delay : float
+        Seconds before the first retry; every further retry waits about twice as long
+    max_delay : float
+        Upper bound of the seconds between two attempts
+
+    Methods
+    -------
+    add(repo_names)
+        Adds the repositories that are not in the queue yet as pending
+    claim(limit)
+        Marks up to limit repositories that are due as in progress and returns them
+    retry_state(repo_name)
+        Returns the modules to mine again and the output so far of a repository that failed partly
+    release(repo_names)
+        Puts claimed repositories that were not mined back to pending
+    done(repo_name)
+        Marks a repository as mined
+    fail(repo_name, error, transient, modules, partial)
+        Records a failed attempt and schedules the retry, if any
+    next_retry_in()
+        Returns the seconds until the next retry is due
+    counts()
+        Returns the number of repositories per state
+    dead_letters()
+        Returns the repositories that are not retried anymore
+    requeue_dead()
+        Makes the dead letters pending again
+    close()
+        Closes the database
+    """
+
+    def __init__(self, path=":memory:", max_attempts=5, base_delay=10, max_delay=600):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS repos ("
+            " name TEXT PRIMARY KEY, position INTEGER, state TEXT, attempts INTEGER, last_error TEXT,"
+            " retry_at REAL, modules TEXT, partial BLOB)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS repos_state ON repos (state, position)")
+        # the run that claimed these is gone; the interrupted attempt still counts
+        self._db.execute("UPDATE repos SET state = ? WHERE state = ?", (PENDING, IN_PROGRESS))
+        self._db.commit()
+
+    def add(self, repo_names):
+        """Adds repo_names as pending, in their order, skipping those already queued; returns the number added"""
+        with self._lock:
+            position = self._db.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM repos").fetchone()[0]
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO repos (name, position, state, attempts) VALUES (?, ?, ?, 0)",
+                ((name, position + index, PENDING) for index, name in enumerate(repo_names))
+            )
+            self._db.commit()
+            return self._db.total_changes - before
+
+    def claim(self, limit=1):
+        """
+        Marks up to limit repositories as in progress and returns their names: pending repositories
+        and failed ones whose retry is due, in the order they were added
+        """
+        with self._lock:
+            names = [name for (name,) in self._db.execute(
+                "SELECT name FROM repos WHERE state = ? OR (state = ? AND retry_at <= ?)"
+                " ORDER BY position LIMIT ?", (PENDING, FAILED, time.time(), limit)
+            )]
+            self._db.executemany(
+                "UPDATE repos SET state = ?, attempts = attempts + 1 WHERE name = ?",
+                ((IN_PROGRESS, name) for name in names)
+            )
+            self._db.commit()
+            return names
+
+    def retry_state(self, repo_name):
+        """
+        Returns (names of the modules to mine again, output of the other modules) of a repository
+        whose last attempt failed in some of its modules, or None if the whole repository is mined
+        """
+        with self._lock:
+            row = self._db.execute("SELECT modules, partial FROM repos WHERE name = ?", (repo_name,)).fetchone()
+        if row is None or row[1] is None:
+            return None
+        # the output is pickled to keep its types (such as datetime) until it is written
+        return row[0].split("\n"), pickle.loads(zlib.decompress(row[1]))
+
+    def release(self, repo_names):
+        """Puts claimed repo_names back to their previous state, without counting the attempt"""
+        with self._lock:
+            self._db.executemany(
+                "UPDATE repos SET state = CASE WHEN retry_at IS NULL THEN ? ELSE ? END, attempts = attempts - 1"
+                " WHERE name = ? AND state = ?", ((PENDING, FAILED, name, IN_PROGRESS) for name in repo_names)
+            )
+            self._db.commit()
+
+    def done(self, repo_name):
+        """Marks repo_name as mined"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE repos SET state = ?, last_error = NULL, retry_at = NULL, modules = NULL, partial = NULL"
+                " WHERE name = ?", (DONE, repo_name)
+            )
+            self._db.commit()
+
+    def fail(self, repo_name, error, transient, modules=None, partial=None):  # pylint: disable=too-many-arguments
+        """
+        Records that the last attempt of repo_name failed with error. When only some modules failed,
+        modules are their names and partial is the output of the others; otherwise the modules and
+        output of an earlier attempt are kept for the retry. Returns the seconds until the retry, or
+        None if the repository is a dead letter now.
+        """
+        with self._lock:
+            attempts = self._db.execute("SELECT attempts FROM repos WHERE name = ?", (repo_name,)).fetchone()[0]
+            delay = None
+            if transient and attempts < self.max_attempts:
+                delay = backoff(attempts, self.base_delay, self.max_delay)
+            self._db.execute(
+                # a failure of the whole repository keeps the output of an earlier, partly failed attempt
+                "UPDATE repos SET state = ?, last_error = ?, retry_at = ?, modules = COALESCE(?, modules),"
+                " partial = COALESCE(?, partial) WHERE name = ?",
+                (FAILED, error, None if delay is None else time.time() + delay, modules and "\n".join(modules),
+                 None if partial is None else zlib.compress(pickle.dumps(partial)), repo_name)
+            )
+            self._db.commit()
+        return delay
+
+    def next_retry_in(self):
+        """Returns the seconds until the next scheduled retry (0 if one is due), or None if there is none"""
+        with self._lock:
+            retry_at = self._db.execute(
+                "SELECT MIN(retry_at) FROM repos WHERE state = ? AND retry_at IS NOT NULL", (FAILED,)
+            ).fetchone()[0]
+        return None if retry_at is None else max(retry_at - time.time(), 0)
+
+    def counts(self):
+        """Returns {state: number of repositories}; dead letters are counted under 'dead'"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT CASE WHEN state = ? AND retry_at IS NULL THEN 'dead' ELSE state END, COUNT(*)"
+                " FROM repos GROUP BY 1", (FAILED,)
+            ).fetchall()
+        return dict(rows)
+
+    def dead_letters(self):
+        """Returns [(repo name, attempts, last error)] of the repositories that are not retried anymore"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT name, attempts, last_error FROM repos WHERE state = ? AND retry_at IS NULL ORDER BY position",
+                (FAILED,)
+            ).fetchall()
+
+    def requeue_dead(self):
+        """
+        Makes the dead letters pending again with a fresh number of attempts, to be mined as a whole;
+        returns how many
+        """
+        with self._lock:
+            changed = self._db.execute(
+                "UPDATE repos SET state = ?, attempts = 0, modules = NULL, partial = NULL"
+                " WHERE state = ? AND retry_at IS NULL", (PENDING, FAILED)
+            ).rowcount
+            self._db.commit()
+        return changed
+
+    def close(self):
+        """Closes the database"""
+        with self._lock:
+            self._db.close()
+
+
+def is_transient(exception):
+    """
+    Whether exception may go away when the same request is sent again later: rate limits, server
+    errors (5xx), timeouts and dropped connections
+    """
+    if isinstance(exception, RateLimitExceededException):
+        return True
+    if isinstance(exception, GithubException):
+        return isinstance(exception.status, int) and exception.status >= 500
+    return isinstance(exception, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                                  TimeoutError, ConnectionError))
+
+
+def backoff(attempt, base_delay, max_delay):
+    """
+    Returns the seconds to wait after failed attempt number attempt (from 1): the exponential delay
+    base_delay * 2 ** (attempt - 1), capped at max_delay, of which a random half is jitter, so that
+    repositories that failed together are not all retried at the same moment
+    """
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
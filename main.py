@@ -1,19 +1,64 @@
 """This is the main (literally) file of the tool. Running this file will mine information."""
+import argparse
+import collections
+import contextvars
 import dataclasses
-import json
+import functools
 import os
 import time
 import threading
 import queue
 import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from dotenv import load_dotenv
 from github import Github
 
-from github.GithubException import RateLimitExceededException
+from github.Consts import DEFAULT_BASE_URL
+from github.GithubException import GithubException, RateLimitExceededException
+from engine.archive import ResponseRecorder, ResponseReplayer
+from engine.cache import ResponseCache
+from engine.clones import CloneCache
+from engine.columnar import write_columnar
+from engine.metrics import write_metrics
+from engine.graphql import RepositoryMetadataFetcher
+from engine.governor import default_governor
+from engine.http import install_hook
+from engine.output import JsonlWriter, compact, merge, read_mined_repos
+from engine.profiler import Profiler, profile
+from engine.shards import parse_shard, select_shard
+from engine.tokens import TokenPool
+from engine.watermarks import WatermarkStore
+from engine.work_queue import WorkQueue, backoff, is_transient
 from modules.commits_module import CommitsModule
-from modules.mining_module import MiningModule
+from modules.description_module import DescriptionModule
+from modules.mining_module import current_repo, current_resources, mining_context
+from modules.popularity_module import PopularityModule, PopularityParams
 from modules.pull_request_module import PullRequestModule
+from modules.repository_module import RepositoryModule, RepositoryParams
+from modules.resources import Resource, plan
+from modules.size_module import SizeModule, SizeParams
+from modules.topics_module import TopicsModule
+
+
+# Seconds before the first retry of a module that failed with a transient error, and at most between two
+MODULE_BASE_DELAY = 2
+MODULE_MAX_DELAY = 60
+
+
+# The modules and params whose output the GraphQL metadata contains: (params enum, {param value:
+# path of its key in the output}), with the None param for a module without params
+METADATA_PARAMS = {
+    DescriptionModule: (None, {None: ('description',)}),
+    TopicsModule: (None, {None: ('topics',)}),
+    RepositoryModule: (RepositoryParams, {RepositoryParams.CREATED_AT.value: ('created_at',)}),
+    PopularityModule: (PopularityParams, {
+        PopularityParams.STAR_COUNT.value: ('popularity', 'star_count'),
+        PopularityParams.WATCHERS_COUNT.value: ('popularity', 'watchers_count'),
+        PopularityParams.FORKS_COUNT.value: ('popularity', 'forks_count'),
+    }),
+    SizeModule: (SizeParams, {SizeParams.REPO_SIZE.value: ('size', 'repos_size')}),
+}
 
 
 def add_input(input_queue):
@@ -32,29 +77,15 @@ def setup():
     return input_queue
 
 
-def write_to_file(extractor, filename, keep_existing_data=False):
-    if keep_existing_data:
-        already_extracted = []
-        if os.path.exists(filename):
-            with open(output_file, 'r', encoding="utf-8") as f:
-                already_extracted = json.load(f)
-
-        for repo in already_extracted:
-            extractor.ci_repos[repo] = already_extracted[repo]
-
-    with open(output_file, 'w', encoding="utf-8") as f:
-        json.dump(extractor.ci_repos, f, indent=3, default=str)
-
-
 @dataclasses.dataclass
-class RepoInfoExtractor:
+class RepoInfoExtractor:  # pylint: disable=too-many-instance-attributes
     """
     Extracts information from a list of repositories
 
     Attributes
     ----------
     github : Github
-        Github object
+        Github object of the calling thread
     ci_repos : dict
         Dictionary containing information about the repositories
     ci_dir_filter : list
@@ -62,16 +93,46 @@ class RepoInfoExtractor:
 
     Methods
     -------
-    extract_info_for_repo(repo_name)
-        Extracts information for a given repository
+    extract_info_for_repo(repo_name, retry)
+        Extracts information for a given repository, or only for the modules that failed before
+    _extract_info_for_repo(repo_name, counter, retry)
+        Detects CI in a repository and mines it, attributing its requests to the repository
+    extract_info_for_repos(repo_names, workers, should_stop, work_queue)
+        Extracts information for a list of repositories, mining up to `workers` of them concurrently
+        and retrying transient failures through a work queue
+    close()
+        Shuts down the module executor
     _extract_yml_files(repo)
         Extracts all the yml files in a repository
     _extract_md_file_content(repo, repo_name)
         Extracts the content of all the md files in a given repository
     """
 
-    def __init__(self, access_token, include_non_ci=False, verbose=False):
-        self.github = Github(access_token)
+    # pylint: disable=too-many-arguments
+    def __init__(self, access_token, include_non_ci=False, verbose=False, modules=None, module_workers=1,
+                 metadata_batch_size=0, governor=None, output=None, base_url=DEFAULT_BASE_URL, module_attempts=3):
+        self.access_token = access_token
+        # The API to mine from, such as a GitHub Enterprise server or a local stand-in
+        self.base_url = base_url
+        # When an output writer is given, every repository is written as soon as it is mined instead
+        # of being kept in self.ci_repos
+        self.output = output
+        # The governor paces all requests from the rate limit headers of the responses, so the
+        # extractor never has to poll the rate limit itself. Extractors without a governor of their
+        # own share the one of the process, which is installed once.
+        self.governor = default_governor(verbose=verbose) if governor is None else governor
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Factories of the modules that are mined for every repository. A factory is called inside
+        # the mining context of the repository and returns a module instance.
+        self.modules = [CommitsModule, functools.partial(PullRequestModule, ['titles'])] if modules is None else modules
+        self._module_executor = ThreadPoolExecutor(max_workers=module_workers) if module_workers > 1 else None
+        # Number of times a module is mined before its transient errors fail the repository
+        self.module_attempts = module_attempts
+        # When set, description, topics, created_at, popularity and size are fetched for a whole batch of
+        # repositories with one GraphQL query instead of by the REST modules
+        self.metadata_batch_size = metadata_batch_size
+        self._metadata = {}
         self.ci_repos = {}
         self.ci_dir_filter = [".circleci", ".github", ".github/workflows"]
         self.include_non_ci = include_non_ci
@@ -79,102 +140,509 @@ class RepoInfoExtractor:
         self.verbose = verbose
 
         if self.verbose:
-            print("Extractor initialized. Requests remaining: ", self.github.get_rate_limit().core.remaining)
-
-    def _mine_repo(self, ci, repo_name):
-        modules = [CommitsModule(), PullRequestModule(['titles'])]
-
-        self.ci_repos[repo_name] = {
-            "repo": repo_name,
-            "ci": ci
+            print("Extractor initialized.")
+
+    @property
+    def github(self):
+        """
+        The Github client of the calling thread. PyGithub keeps mutable state per client (such as the
+        last seen rate limit), so every worker thread gets a client of its own.
+        """
+        if not hasattr(self._local, "github"):
+            self._local.github = Github(self.access_token, base_url=self.base_url)
+        return self._local.github
+
+    def _mine_repo(self, ci, repo_name, factories, repo_info=None):
+        """
+        Mines factories for the current repository into repo_info (a new one unless the output of an
+        earlier, partly failed attempt is given) and writes it. A module that fails, after its own
+        retries, is recorded under 'module_errors' without discarding the results of the other
+        modules. Returns (repo_info, names of the modules that failed with a transient error).
+        """
+        if repo_info is None:
+            repo_info = {
+                "repo": repo_name,
+                "ci": ci
+            }
+        errors = repo_info.pop('module_errors', {})
+        for factory in factories:
+            errors.pop(_module_name(factory), None)
+        metadata = self._metadata.pop(repo_name, None)
+        if metadata is not None:
+            # the prefetched metadata already has the output of these modules and params
+            factories = [factory for factory in map(_without_metadata, factories) if factory is not None]
+
+        transient = []
+        for factory, result in self._mine_modules(factories).items():
+            if isinstance(result, Exception):
+                name = _module_name(factory)
+                if self.verbose:
+                    print(f"Module {name} failed for {repo_name}: {result}")
+                errors[name] = str(result)
+                if is_transient(result):
+                    transient.append(name)
+            else:
+                repo_info.update(result)
+        if errors:
+            repo_info['module_errors'] = errors
+
+        _merge_metadata(repo_info, metadata or {}, _metadata_keys(self.modules))
+        if self.output is not None:
+            self.output.write(repo_name, repo_info)
+        else:
+            self.ci_repos[repo_name] = repo_info
+        return repo_info, transient
+
+    def _mine_modules(self, factories):
+        """
+        Mines factories for the current repository, one after another or on the module executor, and
+        returns {factory: output of the module, or the exception it failed with}
+        """
+        # fetch the resources shared by the modules once, before any module needs them
+        try:
+            with profile(module="shared resources"):
+                current_resources().prefetch(plan(_module_class(factory) for factory in factories), current_repo())
+        except GithubException:
+            # the modules that need the failed resource report the error themselves
+            pass
+
+        if self._module_executor is not None:
+            return self._mine_modules_concurrently(factories)
+        results = {}
+        for factory in factories:
+            try:
+                results[factory] = _mine_module(factory, self.module_attempts)
+            except Exception as exception:  # pylint: disable=broad-except
+                results[factory] = exception
+        return results
+
+    def _mine_modules_concurrently(self, factories):
+        """Runs factories for the current repository on the module executor, see _mine_modules"""
+        futures = {
+            # every task runs in a copy of the current context, so it mines the same repository and
+            # shares its resources
+            self._module_executor.submit(
+                contextvars.copy_context().run, _mine_module, factory, self.module_attempts
+            ): factory
+            for factory in factories
+        }
+        return {
+            factory: future.exception() if future.exception() is not None else future.result()
+            for future, factory in futures.items()
         }
 
-        for module in modules:
-            self.ci_repos[repo_name].update(module.mine())
+    def extract_info_for_repo(self, repo_name, retry=None):
+        """
+        This method extracts information from all modules, or only from the modules of retry, a pair
+        (module names, output so far) of an earlier attempt that failed in those modules. Returns
+        (repo_info, names of the modules that failed with a transient error); repo_info is None for a
+        repository without CI that is not mined.
+        """
+        with self._lock:
+            self.counter += 1
+            counter = self.counter
 
-    def extract_info_for_repo(self, repo_name):
-        """This method extracts information from all modules"""
-        self._check_rate_limit()
+        try:
+            with profile(repo=repo_name):
+                return self._extract_info_for_repo(repo_name, counter, retry)
+        finally:
+            # the metadata of a repository that was not mined (no CI, or failed) is not needed anymore
+            self._metadata.pop(repo_name, None)
 
-        self.counter += 1
+    def _extract_info_for_repo(self, repo_name, counter, retry):
         ci = False
-
         repo = self.github.get_repo(repo_name)
-        MiningModule.repo = repo
 
         if self.verbose:
-            print(f"Extracting info for {repo_name} (repo number {self.counter})")
-            if self.counter % 10 == 0:
-                print(f"Requests remaining: {self.github.get_rate_limit().core.remaining}")
+            print(f"Extracting info for {repo_name} (repo number {counter})")
+            if counter % 10 == 0:
+                print(f"Requests remaining: {self.governor.remaining()}")
+
+        with mining_context(repo):
+            if retry is not None:
+                names, repo_info = retry
+                factories = [factory for factory in self.modules if _module_name(factory) in names]
+                return self._mine_repo(repo_info['ci'], repo_name, factories, repo_info)
+
+            with profile(module="CI detection"):
+                yml_files = self._extract_yml_files(repo)
+                if current_resources().count(Resource.WORKFLOWS, repo) > 0 or yml_files:
+                    ci = True
+
+            if ci or self.include_non_ci:
+                return self._mine_repo(ci, repo_name, self.modules)
+        return None, []
+
+    def prefetch_metadata(self, repo_names):
+        """
+        Fetches the scalar metadata of repo_names with batched GraphQL queries. The metadata of the
+        configured modules and params is merged into the output of each repository when it is mined;
+        nothing is fetched when no configured module mines any of it.
+        """
+        if not _metadata_keys(self.modules):
+            return
+        fetcher = RepositoryMetadataFetcher(self.github, batch_size=self.metadata_batch_size, base_url=self.base_url)
+        try:
+            with profile(module="GraphQL metadata"):
+                self._metadata.update(fetcher.fetch(repo_names))
+        except (GithubException, ValueError, KeyError) as exception:
+            # the repositories are mined with the REST modules instead
+            print(f"Failed to fetch metadata for {len(repo_names)} repositories: {exception}")
+
+    def extract_info_for_repos(self, repo_names, workers=1, should_stop=None, work_queue=None):
+        """
+        Extracts information for every repository in repo_names using a pool of worker threads.
+        Each repository is mined in its own mining context, so the results in self.ci_repos are the
+        same as when calling extract_info_for_repo for every repository one after another.
+        Mining stops scheduling new repositories as soon as should_stop() returns True.
+
+        The repositories are added to work_queue (a WorkQueue; an in-memory one if None), and
+        everything due in the queue is mined, including the retries of transient failures, until
+        nothing is left but dead letters.
+        """
+        own_queue = work_queue is None
+        if own_queue:
+            work_queue = WorkQueue()
+        work_queue.add(repo_names)
+        try:
+            self._mine_queue(work_queue, workers, should_stop)
+        finally:
+            if own_queue:
+                work_queue.close()
+
+    def _mine_queue(self, work_queue, workers, should_stop):
+        pending = {}
+        claimed = collections.deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while should_stop is None or not should_stop():
+                # keep at most two repositories per worker in flight so stopping stays responsive
+                if len(pending) >= 2 * workers:
+                    self._record_results(wait(pending, return_when=FIRST_COMPLETED)[0], pending, work_queue)
+                    continue
+                if not claimed:
+                    claimed.extend(work_queue.claim(max(self.metadata_batch_size, 1)))
+                    if claimed and self.metadata_batch_size:
+                        self.prefetch_metadata(list(claimed))
+                if claimed:
+                    name = claimed.popleft()
+                    pending[executor.submit(self.extract_info_for_repo, name, work_queue.retry_state(name))] = name
+                elif pending:
+                    self._record_results(wait(pending, return_when=FIRST_COMPLETED)[0], pending, work_queue)
+                elif work_queue.next_retry_in() is None:
+                    break
+                else:
+                    # wait for the next retry in short steps, so that stopping stays responsive
+                    time.sleep(min(work_queue.next_retry_in(), 1))
+
+            work_queue.release(claimed)
+            self._record_results(wait(pending)[0], pending, work_queue)
+
+    def _record_results(self, done, pending, work_queue):
+        """Marks the repositories of the done futures as done in work_queue, or records their failure"""
+        for future in done:
+            name = pending.pop(future)
+            if future.exception() is not None:
+                exception = future.exception()
+                error = f"{type(exception).__name__}: {exception}"
+                delay = work_queue.fail(name, error, is_transient(exception))
+            else:
+                repo_info, transient = future.result()
+                if not transient:
+                    work_queue.done(name)
+                    continue
+                error = "; ".join(f"{module}: {repo_info['module_errors'][module]}" for module in transient)
+                delay = work_queue.fail(name, error, True, modules=transient, partial=repo_info)
+            if delay is None:
+                print(f"Error for {name}: {error} (giving up, see dead-letters)")
+            else:
+                print(f"Error for {name}: {error} (retrying in {delay:.0f} s)")
 
-        workflows = repo.get_workflows()
-        yml_files = self._extract_yml_files(repo)
+    def close(self):
+        """Shuts down the threads of the module executor, if any; the extractor cannot mine anymore"""
+        if self._module_executor is not None:
+            self._module_executor.shutdown()
 
-        if workflows.totalCount > 0 or yml_files:
-            ci = True
+    def _extract_yml_files(self, repo):
+        # the yml files in the root and in the CI directories, looked up in the shared tree snapshot
+        tree = current_resources().get(Resource.TREE, repo)
+        return [
+            path for directory in ["", *self.ci_dir_filter] for path in tree.children(directory)
+            if tree.entries[path] == "blob" and (path.endswith(".yml") or path.endswith(".yaml"))
+        ]
 
-        if ci or self.include_non_ci:
-            try:
-                self._mine_repo(ci, repo_name)
-            except RateLimitExceededException:
-                if self.verbose:
-                    print("Rate limit exceeded")
-                self._check_rate_limit()
-                self._mine_repo(ci, repo_name)
 
-    def _extract_yml_files(self, repo):
-        contents = repo.get_contents("")
-        yml_files = []
-        while contents:
-            file_content = contents.pop(0)
-            if file_content.type == "dir" and file_content.name in self.ci_dir_filter:
-                contents.extend(repo.get_contents(file_content.path))
-            else:
-                if file_content.path == ".github/workflows":
-                    contents.extend(repo.get_contents(file_content.path))
-                if file_content.path.endswith(".yml") or file_content.path.endswith(".yaml"):
-                    yml_files.append(file_content)
-        return yml_files
-
-    def _check_rate_limit(self):
-        requests_remaining = self.github.get_rate_limit().core.remaining
-        # threshold of 100 requests remaining before we sleep
-        if requests_remaining < 100:
-            rt = self.github.get_rate_limit()
-            # reset timestamp timezone does not match current timezone
-            # so we calculate the difference modulo 3600 to get the seconds until the next hour reset
-            sleep_for = 3600 - (abs(rt.core.reset.timestamp() - time.time()) % 3600)
-            # 2 minutes buffer
-            sleep_for += 120
-
-            print("Sleeping for: ", sleep_for / 60)
-            time.sleep(sleep_for)
+def _module_class(factory):
+    """Returns the module class of a module factory, which may be a class or a functools.partial"""
+    return factory if isinstance(factory, type) else _module_class(factory.func)
 
 
-if __name__ == '__main__':
+def _module_name(factory):
+    """Returns a readable name for a module factory"""
+    return _module_class(factory).__name__
+
+
+def _merge_metadata(repo_info, metadata, keys):
+    """Merges the keys (paths, see METADATA_PARAMS) of metadata prefetched with GraphQL into repo_info"""
+    for path in keys:
+        value = metadata
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is None:
+            continue
+        target = repo_info
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+
+
+def _factory_params(factory, params_enum):
+    """Returns the params a module factory mines: those it is given, or all values of params_enum"""
+    args = getattr(factory, 'args', ())
+    params = args[0] if args else (getattr(factory, 'keywords', None) or {}).get('params')
+    return [param.value for param in params_enum] if params is None else params
+
+
+def _metadata_keys(factories):
+    """Returns the paths of the output keys of the GraphQL metadata that factories mine"""
+    keys = set()
+    for factory in factories:
+        params_enum, paths = METADATA_PARAMS.get(_module_class(factory), (None, {}))
+        params = [None] if params_enum is None else _factory_params(factory, params_enum)
+        keys.update(paths[value] for value in (getattr(param, 'value', param) for param in params) if value in paths)
+    return keys
+
+
+def _without_metadata(factory):
+    """
+    Returns factory without the params whose output the GraphQL metadata (see engine.graphql) has,
+    or None when nothing is left for the module to mine. A module with params of its own is mined
+    with the remaining ones.
+    """
+    module_class = _module_class(factory)
+    if module_class not in METADATA_PARAMS:
+        return factory
+    params_enum, covered = METADATA_PARAMS[module_class]
+    if params_enum is None:
+        return None
+    keywords = dict(getattr(factory, 'keywords', None) or {})
+    args = list(getattr(factory, 'args', ()))
+    remaining = [
+        param for param in _factory_params(factory, params_enum) if getattr(param, 'value', param) not in covered
+    ]
+    if not remaining:
+        return None
+    if args:
+        return functools.partial(module_class, remaining, *args[1:], **keywords)
+    return functools.partial(module_class, **{**keywords, 'params': remaining})
+
+
+def _mine_module(factory, attempts=1):
+    """
+    Mines the module of factory, trying up to attempts times when it fails with a transient error
+    (see engine.work_queue.is_transient). Rate limit errors are retried at once, since the governor
+    waits for the reset before the next request; other errors after an exponential backoff.
+    """
+    with profile(module=_module_name(factory)):
+        for attempt in range(1, attempts + 1):
+            try:
+                return factory().mine()
+            except Exception as exception:  # pylint: disable=broad-except
+                if attempt == attempts or not is_transient(exception):
+                    raise
+                if not isinstance(exception, RateLimitExceededException):
+                    time.sleep(backoff(attempt, MODULE_BASE_DELAY, MODULE_MAX_DELAY))
+        return None
+
+
+def parse_args():
+    """Parses the command line arguments of the tool"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repos", default="repos.txt",
+                        help="file with the names of the repositories to mine, one per line (default: repos.txt)")
+    parser.add_argument("--output", default="testing.jsonl",
+                        help="JSONL file every mined repository is appended to (default: testing.jsonl)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip the repositories that are already in the output file")
+    parser.add_argument("--queue", metavar="PATH",
+                        help="SQLite work queue with the state of every repository, so that a rerun only mines "
+                             "the repositories that are not done and retries the failed ones")
+    parser.add_argument("--max-attempts", type=int, default=5,
+                        help="times a repository is tried before it is a dead letter (default: 5)")
+    parser.add_argument("--shard", metavar="i/N", type=parse_shard,
+                        help="only mine the repositories of shard i (0 to N-1) of N, partitioned by a hash of the name")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of repositories that are mined concurrently (default: 1)")
+    parser.add_argument("--module-workers", type=int, default=1,
+                        help="number of modules that are mined concurrently for one repository (default: 1)")
+    parser.add_argument("--metadata-batch-size", type=int, default=0,
+                        help="fetch the description, topics, creation date, popularity and size that the "
+                             "modules mine for this many repositories per GraphQL query (default: 0, disabled)")
+    parser.add_argument("--cache", metavar="PATH",
+                        help="SQLite file that caches responses and revalidates them with conditional requests")
+    parser.add_argument("--cache-size", type=int, default=1024,
+                        help="maximum size of the response cache in MB (default: 1024)")
+    parser.add_argument("--clones-dir", metavar="DIR",
+                        help="read commits with git log from bare clones kept in this directory instead of the API")
+    parser.add_argument("--clones-size", type=int,
+                        help="maximum size of the clones in MB; least recently used clones are deleted (default: no limit)")
+    parser.add_argument("--clone-workers", type=int, default=4,
+                        help="number of clones and fetches that run at the same time (default: 4)")
+    parser.add_argument("--blobless-clones", action="store_true",
+                        help="clone without file contents when they are not needed (--filter=blob:none)")
+    parser.add_argument("--columnar", metavar="DIR",
+                        help="also write the dates and commit changes as NumPy columns to this directory at the end")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="write a trace of all requests per repository, module and param to this file "
+                             "(Chrome trace format if it ends with .json, JSONL otherwise) and print a summary")
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument("--record", metavar="DIR",
+                         help="archive every API response of the run in this directory, for --replay")
+    archive.add_argument("--replay", metavar="DIR",
+                         help="answer every API request from the archive in this directory, without network")
+    parser.add_argument("--incremental", metavar="PATH",
+                        help="SQLite file with the state of the previous runs; only mine what changed since then")
+
+    subparsers = parser.add_subparsers(dest="command")
+    dead_parser = subparsers.add_parser("dead-letters", help="list the repositories a work queue gave up on")
+    dead_parser.add_argument("queue", help="the SQLite work queue")
+    dead_parser.add_argument("--requeue", action="store_true",
+                             help="make them pending again, so that the next run with --queue mines them")
+    merge_parser = subparsers.add_parser("merge", help="merge the JSONL output files of several shards into one")
+    merge_parser.add_argument("jsonl", nargs="+", help="the JSONL output files of the shards")
+    merge_parser.add_argument("output", help="the JSONL file to write; of duplicates, the latest mined is kept")
+    compact_parser = subparsers.add_parser("compact", help="turn a JSONL output file into a single JSON file")
+    compact_parser.add_argument("jsonl", help="the JSONL output file")
+    compact_parser.add_argument("json", help="the JSON file to write")
+    columnar_parser = subparsers.add_parser("columnar", help="write the time series of a JSONL output file as NumPy columns")
+    columnar_parser.add_argument("jsonl", help="the JSONL output file")
+    columnar_parser.add_argument("directory", help="the directory to write the tables to")
+    metrics_parser = subparsers.add_parser("metrics", help="compute descriptive metrics from the NumPy columns")
+    metrics_parser.add_argument("directory", help="the directory with the tables written by columnar")
+    metrics_parser.add_argument("json", help="the JSON file to write the metrics to")
+    return parser.parse_args()
+
+
+def install_hooks(args):
+    """Installs the request hooks selected in args in the order they must run, and returns them by name"""
+    hooks = {}
+    # the profiler comes first, so that it sees the waits of the other hooks and the responses of the cache
+    if args.profile:
+        hooks['profiler'] = Profiler(args.profile)
+    # the recorder sees the responses the cache replays; the replayer answers before the rate limit
+    # hooks and the cache see the request
+    if args.record:
+        hooks['recorder'] = ResponseRecorder(args.record)
+    if args.replay:
+        hooks['replayer'] = ResponseReplayer(args.replay)
+    if args.cache:
+        hooks['cache'] = ResponseCache(args.cache, max_bytes=args.cache_size * 1024 ** 2)
+    for hook in hooks.values():
+        install_hook(hook)
+    return hooks
+
+
+def close_hooks(hooks):
+    """Prints the statistics of the hooks returned by install_hooks and closes them"""
+    if 'profiler' in hooks:
+        hooks['profiler'].close()
+        print(hooks['profiler'].summary())
+    if 'recorder' in hooks:
+        print(f"Recorded {hooks['recorder'].recorded} responses to {hooks['recorder'].directory}")
+        hooks['recorder'].close()
+    if 'replayer' in hooks:
+        print("Replayed responses: ", hooks['replayer'].stats())
+        hooks['replayer'].close()
+    if 'cache' in hooks:
+        print("Response cache: ", hooks['cache'].stats())
+        hooks['cache'].close()
+
+
+def print_dead_letters(path, requeue=False):
+    """Prints the dead letters of the work queue at path, and makes them pending again if requeue is set"""
+    work_queue = WorkQueue(path)
+    try:
+        for name, attempts, error in work_queue.dead_letters():
+            print(f"{name}\t{attempts} attempts\t{error}")
+        if requeue:
+            print(f"Requeued {work_queue.requeue_dead()} repositories")
+    finally:
+        work_queue.close()
+
+
+def mine(args):
+    """Mines the repositories listed in args.repos and appends them to args.output"""
     input_queue = setup()
     start = time.time()
-    output_file = "testing.json"
+    hooks = install_hooks(args)
 
     # Read repository names from a file
-    with open('repos.txt', encoding="utf-8") as f:
-        repos = [line.strip() for line in f.readlines()]
-
-    extractor = RepoInfoExtractor(os.environ.get("GITHUB_ACCESS_TOKEN"), include_non_ci=True, verbose=True)
-
-    for name in repos:
-        # User can press q to stop the extraction and save the current state
-        if not input_queue.empty() and input_queue.get() == 'q':
-            break
-        try:
-            extractor.extract_info_for_repo(name)
-        # pylint: disable=broad-except
-        except Exception as e:
-            print(f"Error for {name}: {e}")
-            continue
-    
-    write_to_file(extractor, output_file, keep_existing_data=True)
+    with open(args.repos, encoding="utf-8") as file:
+        repos = [line.strip() for line in file.readlines() if line.strip()]
+
+    if args.shard:
+        repos = select_shard(repos, *args.shard)
+        print(f"Shard {args.shard[0]}/{args.shard[1]}: {len(repos)} repositories")
+
+    if args.resume:
+        mined = read_mined_repos(args.output)
+        repos = [name for name in repos if name not in mined]
+        print(f"Resuming: {len(mined)} repositories already mined, {len(repos)} to go")
+
+    # Several tokens can be given as a comma separated list in GITHUB_ACCESS_TOKENS
+    tokens = [token.strip() for token in os.environ.get("GITHUB_ACCESS_TOKENS", "").split(",") if token.strip()]
+    if not tokens and os.environ.get("GITHUB_ACCESS_TOKEN"):
+        tokens = [os.environ.get("GITHUB_ACCESS_TOKEN")]
+
+    if len(tokens) > 1:
+        install_hook(TokenPool(tokens, verbose=True))
+
+    clones = None
+    if args.clones_dir:
+        clones = CloneCache(args.clones_dir, max_bytes=args.clones_size and args.clones_size * 1024 ** 2,
+                            workers=args.clone_workers, blobless=args.blobless_clones, verbose=True)
+    watermarks = WatermarkStore(args.incremental) if args.incremental else None
+    modules = [functools.partial(CommitsModule, clones=clones, watermarks=watermarks),
+               functools.partial(PullRequestModule, ['titles'], watermarks=watermarks)]
+
+    work_queue = WorkQueue(args.queue or ":memory:", max_attempts=args.max_attempts)
+    output = JsonlWriter(args.output)
+    extractor = RepoInfoExtractor(tokens[0] if tokens else None, include_non_ci=True, verbose=True, modules=modules,
+                                  module_workers=args.module_workers, metadata_batch_size=args.metadata_batch_size,
+                                  output=output)
+
+    try:
+        # User can press q to stop the extraction; everything mined so far is already saved
+        extractor.extract_info_for_repos(repos, workers=args.workers, work_queue=work_queue,
+                                         should_stop=lambda: not input_queue.empty() and input_queue.get() == 'q')
+    finally:
+        print("Work queue: ", work_queue.counts())
+        extractor.close()
+        work_queue.close()
+        output.close()
+        if watermarks is not None:
+            watermarks.close()
+        close_hooks(hooks)
+
+    if args.columnar:
+        print(f"Wrote {write_columnar(args.output, args.columnar)} repositories to {args.columnar}")
 
     end = time.time()
 
     print("Time taken: ", end - start)
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    if arguments.command == "dead-letters":
+        print_dead_letters(arguments.queue, arguments.requeue)
+    elif arguments.command == "merge":
+        written, dropped = merge(arguments.jsonl, arguments.output)
+        print(f"Wrote {written} repositories to {arguments.output}, dropped {dropped} older duplicates")
+    elif arguments.command == "compact":
+        print(f"Wrote {compact(arguments.jsonl, arguments.json)} repositories to {arguments.json}")
+    elif arguments.command == "columnar":
+        print(f"Wrote {write_columnar(arguments.jsonl, arguments.directory)} repositories to {arguments.directory}")
+    elif arguments.command == "metrics":
+        print(f"Wrote the metrics of {write_metrics(arguments.directory, arguments.json)} repositories to {arguments.json}")
+    else:
+        mine(arguments)
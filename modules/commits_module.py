@@ -2,12 +2,15 @@
 import dataclasses
 from enum import Enum
 
+from modules import git_log, incremental, pagination
 from modules.exception import ModuleParamException
 from modules.mining_module import MiningModule
+from modules.pagination import stream
+from modules.resources import Resource
 
 
 @dataclasses.dataclass
-class CommitsModule(MiningModule):
+class CommitsModule(MiningModule):  # pylint: disable=too-many-instance-attributes
     """
     This class mines commit information
 
@@ -15,20 +18,38 @@ class CommitsModule(MiningModule):
     ----------
     params : list
         List of parameters to mine. Possible values are: 'messages', 'count', 'commit_meta', 'date'
+    path : str
+        Only mine the commits that touch this file
+    clones : CloneCache
+        When given, the commits are read with git log from the mirror of the repository in this
+        clone cache instead of from the API. The mirror only needs blobs when 'commit_meta' is mined,
+        which needs the file contents for the line counts.
+    watermarks : WatermarkStore
+        When given, only the commits after the newest commit of the previous run are fetched from
+        the API, and the values of the older commits are taken from the store. Commits are selected
+        with since=, which filters on the commit date, so commits that are merged later but were
+        committed before the watermark are not picked up.
 
     Attributes
     ----------
     commits : PaginatedList[Commit]
-        An object where you can extract all kinds of commit information from
+        An object where you can extract all kinds of commit information from. Not used when the
+        commits are read from a clone.
     json : dict
         Dictionary containing information about the commits
     params: list
         A list that contains what information you want from the repository in this module
+    per_commit : list
+        Functions that are called with every commit during the single pass over the commits
 
     Methods
     -------
     mine()
         The main entry point to this class. Calling this function will mine all the data in the body
+    _mine_clone()
+        Extracts the params from the commits of a local clone instead of the API
+    _mine_incrementally()
+        Extracts the params from the commits since the previous run and merges the stored ones
     _extract_param_info(param)
         Calls the right function given a parameter from self.params
     _extract_commit_messages()
@@ -37,23 +58,99 @@ class CommitsModule(MiningModule):
         Extracts the number of commits from a repository
     _extract_commit_meta()
         Extracts the changes per file in commits from a repository
+    _extract_meta_of_commit(commit)
+        Extracts the changes of the file of interest in a single commit
     _extract_commit_date()
         Extracts the commit date of all commits
     """
 
-    def __init__(self, params=None, path=None):
+    required_resources = (Resource.COMMITS,)
+
+    def __init__(self, params=None, path=None, clones=None, watermarks=None):
         self.path = path
-        self.commits =  self.repo.get_commits(path=path) if path else self.repo.get_commits()
+        self.clones = clones
+        self.watermarks = watermarks
+        self.commits = self.repo.get_commits(path=path) if path else self.shared(Resource.COMMITS)
 
         self.json = {'commits': {}}
         self.params = [c.value for c in CommitParams] if params is None else params
+        self.per_commit = []
+        self._count_requested = False
 
     def mine(self):
-        """Mines all the data in self.params and returns a dictionary with all the mined data"""
+        """
+        Mines all the data in self.params and returns a dictionary with all the mined data. The
+        commits are downloaded once and every param is extracted from that single pass.
+        """
         for param in self.params:
             self._extract_param_info(param)
+
+        with self.single_pass():
+            if self.clones:
+                self._mine_clone()
+            elif self.per_commit and self.watermarks is not None:
+                self._mine_incrementally()
+            elif self.per_commit:
+                count = 0
+                for commit in stream(self.commits):
+                    count += 1
+                    for extract in self.per_commit:
+                        extract(commit)
+                if self._count_requested:
+                    self.json['commits']['count'] = count
+            elif self._count_requested:
+                self.json['commits']['count'] = pagination.count(self.commits) if self.path else \
+                    self.shared_count(Resource.COMMITS)
+
         return self.json
 
+    def _mine_clone(self):
+        """Runs the same extractors over the commits of a local clone, with one git log"""
+        with_files = 'meta' in self.json['commits']
+        paths = [self.path] if self.path else []
+        with self.clones.open(self.repo.full_name, blobs=with_files) as clone:
+            if not self.per_commit:
+                if self._count_requested:
+                    self.json['commits']['count'] = git_log.count_commits(clone, paths)
+                return
+
+            count = 0
+            for commit in git_log.iter_commits(clone, paths, with_files):
+                count += 1
+                for extract in self.per_commit:
+                    extract(commit)
+            if self._count_requested:
+                self.json['commits']['count'] = count
+
+    def _mine_incrementally(self):
+        keys = [key for key in self.json['commits'] if key != 'count']
+        module = 'commits:' + self.path if self.path else 'commits'
+        watermark, stored = self.watermarks.load(self.repo.full_name, module, keys)
+
+        commits = self.commits
+        if watermark is not None:
+            commits = self.repo.get_commits(since=watermark, **({'path': self.path} if self.path else {}))
+
+        known = set(stored['ids']) if stored else set()
+        ids = []
+        for commit in stream(commits):
+            # since= includes the newest commit of the previous run
+            if commit.sha in known:
+                continue
+            ids.append(commit.sha)
+            date = commit.commit.committer.date
+            watermark = date if watermark is None else max(watermark, date)
+            for extract in self.per_commit:
+                extract(commit)
+
+        items = {'ids': ids, **{key: self.json['commits'][key] for key in keys}}
+        if stored:
+            items = incremental.prepend(stored, items, keys)
+            self.json['commits'].update({key: items[key] for key in keys})
+        if self._count_requested:
+            self.json['commits']['count'] = len(items['ids'])
+        self.watermarks.save(self.repo.full_name, module, keys, watermark, items)
+
     def _extract_param_info(self, param):
         if param in (CommitParams.MESSAGES, CommitParams.MESSAGES.value):
             self._extract_commit_messages()
@@ -67,36 +164,86 @@ class CommitsModule(MiningModule):
             raise ModuleParamException("Module does not have param: " + str(param))
 
     def _extract_commit_messages(self):
-        self.json['commits']['messages'] = [commit.commit.message for commit in self.commits]
+        messages = self.json['commits']['messages'] = []
+        self.per_commit.append(lambda commit: messages.append(commit.commit.message))
 
     def _extract_commit_count(self):
-        self.json['commits']['count'] = self.commits.totalCount
+        # counted during the pass over the commits, or with a single request if there is no pass
+        self.json['commits']['count'] = None
+        self._count_requested = True
 
     def _extract_commit_meta(self):
         self.json['commits']['meta'] = []
+        self.per_commit.append(self._extract_meta_of_commit)
 
-        for commit in self.commits:
-            config_file = next((
-                file for file in commit.files
-                if (file.filename == self.path if self.path else True)
-            ), None)
-
-            file_meta = {
-                'status': config_file.status,
-                'additions': config_file.additions,
-                'deletions': config_file.deletions,
-                'changes': config_file.changes,
-            } if config_file else None
-
-            self.json['commits']['meta'].append({
-                'message': commit.commit.message,
-                'date': commit.commit.last_modified,
-                'sha': commit.commit.sha,
-                'file': file_meta
-            })
+    def _extract_meta_of_commit(self, commit):
+        self.json['commits']['meta'].append(meta_of_commit(commit, self.path))
 
     def _extract_commit_date(self):
-        self.json['commits']['dates'] = [commit.commit.committer.date for commit in self.commits]
+        dates = self.json['commits']['dates'] = []
+        self.per_commit.append(lambda commit: dates.append(commit.commit.committer.date))
+
+
+def meta_of_commit(commit, path=None):
+    """
+    Returns the message, date and sha of commit, and the changes it made to the file at path (or to
+    its first file if no path is given)
+    """
+    changed_file = next((
+        file for file in commit.files
+        if (file.filename == path if path else True)
+    ), None)
+
+    file_meta = {
+        'status': changed_file.status,
+        'additions': changed_file.additions,
+        'deletions': changed_file.deletions,
+        'changes': changed_file.changes,
+    } if changed_file else None
+
+    return {
+        'message': commit.commit.message,
+        'date': commit.commit.last_modified,
+        'sha': commit.commit.sha,
+        'file': file_meta
+    }
+
+
+def file_histories(repo, paths, clones=None):
+    """
+    Returns {path: commit meta of every commit that changed path, newest first} for all paths at
+    once, in the format of the 'meta' output of CommitsModule.
+
+    With clones, a CloneCache, a single git log over all paths is read from the mirror of repo.
+    Otherwise the commits of every path are listed through the API, and the files of a commit that
+    changed several of the paths are loaded only once.
+    """
+    histories = {path: [] for path in paths}
+    if not paths:
+        return histories
+
+    if clones:
+        with clones.open(repo.full_name) as clone:
+            for commit in git_log.iter_commits(clone, list(paths)):
+                # a file that was renamed away still has the commit in its history, like through the API
+                changed = {file.filename for file in commit.files}
+                changed.update(file.previous_filename for file in commit.files)
+                for path in paths:
+                    if path in changed:
+                        histories[path].append(meta_of_commit(commit, path))
+        return histories
+
+    commits = {}
+    shas = {}
+    for path in paths:
+        shas[path] = []
+        for commit in stream(repo.get_commits(path=path)):
+            # the same object for every path, so that commit.files is requested once
+            commits.setdefault(commit.sha, commit)
+            shas[path].append(commit.sha)
+    for path in paths:
+        histories[path] = [meta_of_commit(commits[sha], path) for sha in shas[path]]
+    return histories
 
 
 class CommitParams(Enum):
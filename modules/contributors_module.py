@@ -3,6 +3,7 @@ from enum import Enum
 
 from modules.exception import ModuleParamException
 from modules.mining_module import MiningModule
+from modules.resources import Resource
 
 
 class ContributorsModule(MiningModule):
@@ -30,9 +31,11 @@ class ContributorsModule(MiningModule):
         Extract the number of contributions for the top 50% contributors to the repository,
          who also have more than 10 commits.
     """
+    required_resources = (Resource.CONTRIBUTORS,)
+
     def __init__(self, params, top_percentage_of_contributors=0.5):
         self.repo = super().repo
-        self.contributors = self.repo.get_contributors()
+        self.contributors = self.shared(Resource.CONTRIBUTORS)
         self.json = {'contributors': {}}
         self.params = params
         self.top_percentage_of_contributors = top_percentage_of_contributors
@@ -52,7 +55,7 @@ class ContributorsModule(MiningModule):
             raise ModuleParamException("Module does not have param: " + str(param))
 
     def _extract_contributors_count(self):
-        self.json['contributors']['count'] = self.contributors.totalCount
+        self.json['contributors']['count'] = self.shared_count(Resource.CONTRIBUTORS)
 
 
     def _extract_contributions_per_contributor(self):
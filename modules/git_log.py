@@ -0,0 +1,156 @@
+"""Helpers for mining commits from a local clone instead of the API"""
+import dataclasses
+import datetime
+import email.utils
+import re
+
+# git log --raw status letters and the status names the API uses for the files of a commit
+STATUSES = {
+    'A': 'added',
+    'M': 'modified',
+    'D': 'removed',
+    'R': 'renamed',
+    'C': 'copied',
+    'T': 'changed',
+}
+
+_COMMIT_MARK = b"\x1e"
+_NUMSTAT = re.compile(rb"^(\d+|-)\t(\d+|-)\t")
+
+
+@dataclasses.dataclass
+class LocalFile:
+    """A file changed by a commit, with the same attributes as github.File.File"""
+    filename: str
+    status: str
+    additions: int = 0
+    deletions: int = 0
+    previous_filename: str = None
+
+    @property
+    def changes(self):
+        """The number of changed lines"""
+        return self.additions + self.deletions
+
+
+@dataclasses.dataclass
+class LocalCommit:
+    """
+    A commit read from a local clone. It has the attributes of github.Commit.Commit and of its
+    GitCommit (commit.commit) that the modules read, so it can be passed to the same extractors.
+    """
+    sha: str
+    message: str
+    date: datetime.datetime
+    files: list = dataclasses.field(default_factory=list)
+
+    @property
+    def commit(self):
+        """The git data of the commit, which locally is the commit itself"""
+        return self
+
+    @property
+    def committer(self):
+        """The committer of the commit; only its date is known"""
+        return self
+
+    @property
+    def last_modified(self):
+        """The committer date in the format of the Last-Modified header the API sends"""
+        timestamp = self.date.replace(tzinfo=datetime.timezone.utc).timestamp()
+        return email.utils.formatdate(timestamp, usegmt=True)
+
+
+def count_commits(repo, paths=()):
+    """Returns the number of commits reachable from HEAD, only counting those that touch paths if given"""
+    return int(repo.git.rev_list("--count", "HEAD", *(["--", *paths] if paths else [])))
+
+
+def iter_commits(repo, paths=(), with_files=True):
+    """
+    Yields the commits reachable from HEAD, newest first, as LocalCommit objects, from a single
+    git log process whose output is parsed while it is read. With paths, only the commits that touch
+    any of paths are yielded. With with_files, the files of every commit are read with --raw
+    --numstat; without paths, merge commits are compared with their first parent, like the API does.
+    """
+    args = ["-z", "--format=%x1e%H%x00%ct%x00%B"]
+    if with_files:
+        args += ["--raw", "--numstat", "-M"]
+        if paths:
+            # show all files of the commits, so that renames into paths are detected. Merges are
+            # left to history simplification, as diffing them would also list merges that did not
+            # change paths.
+            args.append("--full-diff")
+        else:
+            args.append("--diff-merges=first-parent")
+    args.append("HEAD")
+    if paths:
+        args += ["--", *paths]
+
+    process = repo.git.log(*args, as_process=True)
+    try:
+        yield from _parse(_tokens(process.proc.stdout))
+    finally:
+        process.proc.stdout.close()
+        process.proc.wait()
+
+
+def _tokens(stream, chunk_size=1 << 16):
+    """Splits the NUL separated output of git log -z into tokens without reading it all at once"""
+    rest = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        tokens = (rest + chunk).split(b"\0")
+        rest = tokens.pop()
+        yield from tokens
+    if rest:
+        yield rest
+
+
+def _parse(tokens):
+    commit = None
+    files = {}
+    for token in tokens:
+        if token.startswith(_COMMIT_MARK):
+            if commit:
+                yield commit
+            date = datetime.datetime.fromtimestamp(int(next(tokens, b"")), datetime.timezone.utc)
+            commit = LocalCommit(
+                sha=token[1:].decode(),
+                message=next(tokens, b"").decode(errors="replace").rstrip("\n"),
+                date=date.replace(tzinfo=None),
+            )
+            files = {}
+            continue
+
+        token = token.lstrip(b"\n")
+        if token.startswith(b":"):
+            # :<old mode> <new mode> <old sha> <new sha> <status><score>, then the path(s)
+            status = chr(token.split()[-1][0])
+            paths = [next(tokens, b"").decode(errors="replace")]
+            if status in "RC":
+                paths.append(next(tokens, b"").decode(errors="replace"))
+            file = LocalFile(paths[-1], STATUSES.get(status, 'changed'))
+            if len(paths) == 2:
+                file.previous_filename = paths[0]
+            files[file.filename] = file
+            commit.files.append(file)
+            continue
+
+        match = _NUMSTAT.match(token)
+        if match:
+            path = token[match.end():]
+            if not path:
+                # renames and copies: the old and the new path follow as separate tokens
+                next(tokens, b"")
+                path = next(tokens, b"")
+            file = files.get(path.decode(errors="replace"))
+            if file:
+                # binary files have - as line counts, and the API reports 0 for them
+                file.additions = int(match.group(1)) if match.group(1) != b"-" else 0
+                file.deletions = int(match.group(2)) if match.group(2) != b"-" else 0
+
+    if commit:
+        yield commit
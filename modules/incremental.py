@@ -0,0 +1,33 @@
+"""
+Helpers for merging the items mined since the previous run into the items stored by a
+WatermarkStore. Items are kept column-wise, like in the output of the modules: {'ids': [...], key:
+[...], ...} holds one list per extracted value, all in the same item order.
+"""
+
+
+def prepend(stored, new, keys):
+    """
+    Returns the new items followed by the stored ones. For items that are only ever added in front,
+    such as commits and releases.
+    """
+    return {key: new[key] + stored[key] for key in ['ids', *keys]}
+
+
+def upsert(stored, new, keys, removed=()):
+    """
+    Returns the stored items updated with the new ones. A new item replaces the stored item with the
+    same id, items whose id is in removed are dropped, and the result is ordered by id, highest first
+    (the order in which the API lists issues and pull requests by default).
+    """
+    rows = {}
+    for items in (stored, new):
+        for item_id, *values in zip(items['ids'], *(items[key] for key in keys)):
+            rows[item_id] = values
+    for item_id in removed:
+        rows.pop(item_id, None)
+
+    ids = sorted(rows, reverse=True)
+    merged = {'ids': ids}
+    for index, key in enumerate(keys):
+        merged[key] = [rows[item_id][index] for item_id in ids]
+    return merged
@@ -1,14 +1,27 @@
 """Module for mining issue information"""
 from enum import Enum
 
+from modules import incremental
 from modules.exception import ModuleParamException
 from modules.mining_module import MiningModule
+from modules.pagination import stream
 
 
 class IssueModule(MiningModule):
     """
     This class mines issue information
 
+    Parameters
+    ----------
+    params : list
+        List of parameters to mine. Possible values are: 'created_at', 'closed_at'
+    watermarks : WatermarkStore
+        When given, only the issues updated since the previous run are fetched (since=,
+        sort=updated) and merged into the issues stored by the previous run
+    state : str
+        The issues to mine: 'open' (the default), 'closed' or 'all'. Only closed issues have a
+        close date, so the time to close (see engine.metrics) needs 'closed' or 'all'.
+
     Attributes
     ----------
     issues : PaginatedList[Issue]
@@ -17,6 +30,8 @@ class IssueModule(MiningModule):
         Dictionary containing information about the issues
     params: list
         A list that contains what information you want from the repository in this module
+    per_issue : list
+        Functions that are called with every issue during the single pass over the issues
 
     Methods
     -------
@@ -24,18 +39,27 @@ class IssueModule(MiningModule):
         The main entry point to this class. Calling this function will mine all the data in the body
     _extract_param_info(param)
         Calls the right function given a parameter from self.params
+    _mine_incrementally()
+        Extracts the params from the issues updated since the previous run and merges the stored ones
     _extract_creation_date()
         Extracts the creation date of the issues
     _extract_close_date()
         Extracts the close date of the issues
     """
 
-    def __init__(self, params=None):
-        self.issues = super().repo.get_issues()
+    def __init__(self, params=None, watermarks=None, state='open'):
+        self.issues = super().repo.get_issues(state=state)
+        self.watermarks = watermarks
+        self.state = state
         self.json = {'issues': {}}
         self.params = [i.value for i in IssueParams] if params is None else params
+        self.per_issue = []
 
     def mine(self):
+        """
+        Mines all the data in self.params and returns a dictionary with all the mined data. The
+        issues are downloaded once and every param is extracted from that single pass.
+        """
         for param in self.params:
             if param in (IssueParams.CREATED_AT, IssueParams.CREATED_AT.value):
                 self._extract_creation_date()
@@ -43,13 +67,51 @@ class IssueModule(MiningModule):
                 self._extract_close_date()
             else:
                 raise ModuleParamException("Module does not have param: " + str(param))
+
+        with self.single_pass():
+            if self.per_issue and self.watermarks is not None:
+                self._mine_incrementally()
+            elif self.per_issue:
+                for issue in stream(self.issues):
+                    for extract in self.per_issue:
+                        extract(issue)
         return self.json
 
+    def _mine_incrementally(self):
+        keys = list(self.json['issues'])
+        # every state has a watermark of its own, so changing the state mines everything again
+        module = 'issues' if self.state == 'open' else f'issues_{self.state}'
+        watermark, stored = self.watermarks.load(self.repo.full_name, module, keys)
+
+        issues = self.issues
+        if watermark is not None:
+            # issues of every state, so that issues whose state changed since are removed
+            issues = self.repo.get_issues(state='all', since=watermark, sort='updated', direction='asc')
+
+        ids = []
+        removed = []
+        for issue in stream(issues):
+            watermark = issue.updated_at if watermark is None else max(watermark, issue.updated_at)
+            if self.state not in ('all', issue.state):
+                removed.append(issue.number)
+                continue
+            ids.append(issue.number)
+            for extract in self.per_issue:
+                extract(issue)
+
+        items = {'ids': ids, **self.json['issues']}
+        if stored:
+            items = incremental.upsert(stored, items, keys, removed=removed)
+            self.json['issues'].update({key: items[key] for key in keys})
+        self.watermarks.save(self.repo.full_name, module, keys, watermark, items)
+
     def _extract_creation_date(self):
-        self.json['issues']['creation_dates'] = [issue.created_at for issue in self.issues]
+        creation_dates = self.json['issues']['creation_dates'] = []
+        self.per_issue.append(lambda issue: creation_dates.append(issue.created_at))
 
     def _extract_close_date(self):
-        self.json['issues']['close_dates'] = [issue.closed_at for issue in self.issues]
+        close_dates = self.json['issues']['close_dates'] = []
+        self.per_issue.append(lambda issue: close_dates.append(issue.closed_at))
 
 
 class IssueParams(Enum):
@@ -1,17 +1,102 @@
 """Module for mining pull request information"""
 import abc
+import contextlib
+import contextvars
+import functools
 
 from github import Repository
 
+from engine.profiler import profile
+from modules.resources import RepoResources
+
+_current_repo: contextvars.ContextVar = contextvars.ContextVar("current_repo", default=None)
+_current_resources: contextvars.ContextVar = contextvars.ContextVar("current_resources", default=None)
+
+
+@contextlib.contextmanager
+def mining_context(repo, resources=None):
+    """
+    Binds a repository to the current thread (or asyncio task) for as long as the context is
+    open. Every module created inside the context mines this repository, and shares the resources
+    fetched for it (see modules.resources).
+    """
+    repo_token = _current_repo.set(repo)
+    resources_token = _current_resources.set(RepoResources() if resources is None else resources)
+    try:
+        yield repo
+    finally:
+        _current_resources.reset(resources_token)
+        _current_repo.reset(repo_token)
+
+
+def current_repo():
+    """Returns the repository bound to the current mining context, or None outside of one"""
+    return _current_repo.get()
+
+
+def current_resources():
+    """Returns the shared resources of the current mining context, or None outside of one"""
+    return _current_resources.get()
+
 
 class MiningModule(abc.ABC):
     """
-    This class is an abstract base class. All modules should inherit from this class. This class
-    also contains a class variable, repo. Since all child classes will use the same repo, they
-    can access that repo here.
+    This class is an abstract base class. All modules should inherit from this class. Its repo
+    property is the repository bound to the current mining context (see mining_context), so
+    modules created in different threads or tasks each mine their own repository. Bind the
+    repository with mining_context; assigning self.repo only overrides it for that one module.
+
+    Modules list the shared resources they use (see modules.resources) in required_resources and
+    obtain them with shared() and shared_count(), so that the tree snapshot and the counts of the
+    paginated resources are fetched only once however many modules need them.
     """
 
-    repo: Repository.Repository = None
+    required_resources = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # every param is mined inside a profile() block, so requests are attributed to the param
+        if '_extract_param_info' in cls.__dict__:
+            cls._extract_param_info = _profiled_param(cls._extract_param_info)
+
+    @property
+    def repo(self) -> Repository.Repository:
+        """
+        The repository bound to the current mining context. Modules that assign self.repo keep
+        their own value instead.
+        """
+        if "repo" in self.__dict__:
+            return self.__dict__["repo"]
+        return current_repo()
+
+    @repo.setter
+    def repo(self, value):
+        self.__dict__["repo"] = value
+
+    def shared(self, resource):
+        """Returns a resource of the mined repository that is shared with the other modules"""
+        return self._resources().get(resource, self.repo)
+
+    def shared_count(self, resource):
+        """Returns the total count of a shared paginated resource"""
+        return self._resources().count(resource, self.repo)
+
+    def single_pass(self):
+        """
+        Returns a profile() block for the single pass over a resource in which a module extracts all
+        its params, so that the requests of the pass are attributed to those params (joined by
+        commas) instead of to no param at all
+        """
+        params = getattr(self, 'params', None) or ()
+        return profile(param=",".join(str(getattr(param, 'value', param)) for param in params))
+
+    @staticmethod
+    def _resources():
+        resources = current_resources()
+        if resources is None:
+            # outside of a mining context there is nothing to share with
+            resources = RepoResources()
+        return resources
 
     @abc.abstractmethod
     def mine(self):
@@ -23,3 +108,11 @@ class MiningModule(abc.ABC):
         to have at least 2 public methods.
         """
         return self.repo
+
+
+def _profiled_param(extract_param_info):
+    @functools.wraps(extract_param_info)
+    def wrapper(self, param, *args, **kwargs):
+        with profile(param=str(getattr(param, 'value', param))):
+            return extract_param_info(self, param, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,57 @@
+"""Helpers for walking PyGithub paginated lists"""
+from urllib.parse import parse_qs, urlparse
+
+
+def stream(paginated_list):
+    """
+    Yields the elements of a PaginatedList page by page. Unlike iterating the list itself, the pages
+    are not kept in the list, so only one page of PyGithub objects is held in memory at a time. Each
+    page is downloaded exactly once.
+    """
+    # pylint: disable=protected-access
+    per_page = paginated_list._PaginatedList__requester.per_page
+    page = 0
+    while True:
+        elements = paginated_list.get_page(page)
+        yield from elements
+        if len(elements) < per_page:
+            return
+        page += 1
+
+
+def count(paginated_list):
+    """
+    Returns the number of elements of a PaginatedList with exactly one request, without downloading
+    them. The first page is requested with per_page=1, so the page number of its Link rel="last"
+    URL is the count. Responses that carry a total_count (such as the workflows) use that instead.
+
+    Unlike PaginatedList.totalCount, the Link URL is parsed properly whatever the order of its
+    query parameters. The result is not cached; callers that need a count more than once keep it
+    (see RepoResources.count).
+    """
+    # pylint: disable=protected-access
+    requester = paginated_list._PaginatedList__requester
+    params = dict(paginated_list._PaginatedList__firstParams or {})
+    params["per_page"] = 1
+    headers, data = requester.requestJsonAndCheck(
+        "GET", paginated_list._PaginatedList__firstUrl, parameters=params,
+        headers=paginated_list._PaginatedList__headers
+    )
+
+    last = _last_page_url(headers.get("link", ""))
+    if last is not None:
+        return int(parse_qs(urlparse(last).query).get("page", ["1"])[0])
+    if isinstance(data, dict):
+        if "total_count" in data:
+            return data["total_count"]
+        data = data.get(paginated_list._PaginatedList__list_item, [])
+    # a single page (or none): per_page=1 means it has at most one element
+    return len(data or [])
+
+
+def _last_page_url(link_header):
+    for link in link_header.split(","):
+        url, _, rel = link.partition(";")
+        if 'rel="last"' in rel:
+            return url.strip().strip("<>")
+    return None
@@ -54,11 +54,12 @@ class PopularityModule(MiningModule):
         else:
             raise ModuleParamException("Module does not have param: " + str(param))
 
+    # The counts are fields of the repository, so they need no requests besides get_repo
     def _extract_star_count(self):
-        self.json['popularity']['star_count'] = self.repo.get_stargazers().totalCount
+        self.json['popularity']['star_count'] = self.repo.stargazers_count
 
     def _extract_watchers_count(self):
-        self.json['popularity']['watchers_count'] = self.repo.get_subscribers().totalCount
+        self.json['popularity']['watchers_count'] = self.repo.subscribers_count
 
     def _extract_forks_count(self):
         self.json['popularity']['forks_count'] = self.repo.forks_count
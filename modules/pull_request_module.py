@@ -2,8 +2,10 @@
 import dataclasses
 from enum import Enum
 
+from modules import incremental
 from modules.exception import ModuleParamException
 from modules.mining_module import MiningModule
+from modules.pagination import stream
 
 
 @dataclasses.dataclass
@@ -15,6 +17,10 @@ class PullRequestModule(MiningModule):
     ----------
     params : list
         List of parameters to mine. Possible values are: 'titles', 'bodies'
+    watermarks : WatermarkStore
+        When given, only the pull requests updated since the previous run are fetched (newest
+        updated first, until the watermark) and merged into the pull requests stored by the previous
+        run
 
     Attributes
     ----------
@@ -22,11 +28,16 @@ class PullRequestModule(MiningModule):
         An object where you can extract all kinds of pull request information from
     json : dict
         Dictionary containing information about the pull requests
+    per_pull : list
+        Functions that are called with every pull request during the single pass over the pulls
 
     Methods
     -------
     mine()
         The main entry point to this class. Calling this function will mine all the data in the body
+    _mine_incrementally()
+        Extracts the params from the pull requests updated since the previous run and merges the
+        stored ones
     _extract_param_info(param)
         Calls the right function given a parameter from self.params
     _extract_pull_request_titles()
@@ -35,17 +46,55 @@ class PullRequestModule(MiningModule):
         Extracts the bodies of the pull requests from a repository
     """
 
-    def __init__(self, params=None):
+    def __init__(self, params=None, watermarks=None):
         self.pulls = super().repo.get_pulls(state='all')
+        self.watermarks = watermarks
         self.json = {'pull_requests': {}}
         self.params = [c.value for c in PullRequestParams] if params is None else params
+        self.per_pull = []
 
     def mine(self):
-        """Mines all the data in self.params and returns a dictionary with all the mined data"""
+        """
+        Mines all the data in self.params and returns a dictionary with all the mined data. The pull
+        requests are downloaded once and every param is extracted from that single pass.
+        """
         for param in self.params:
             self._extract_param_info(param)
+
+        with self.single_pass():
+            if self.per_pull and self.watermarks is not None:
+                self._mine_incrementally()
+            elif self.per_pull:
+                for pull in stream(self.pulls):
+                    for extract in self.per_pull:
+                        extract(pull)
         return self.json
 
+    def _mine_incrementally(self):
+        keys = list(self.json['pull_requests'])
+        watermark, stored = self.watermarks.load(self.repo.full_name, 'pull_requests', keys)
+
+        pulls = self.pulls
+        if watermark is not None:
+            # the pulls endpoint has no since=, so walk them newest updated first up to the watermark
+            pulls = self.repo.get_pulls(state='all', sort='updated', direction='desc')
+
+        ids = []
+        newest = watermark
+        for pull in stream(pulls):
+            if watermark is not None and pull.updated_at < watermark:
+                break
+            newest = pull.updated_at if newest is None else max(newest, pull.updated_at)
+            ids.append(pull.number)
+            for extract in self.per_pull:
+                extract(pull)
+
+        items = {'ids': ids, **self.json['pull_requests']}
+        if stored:
+            items = incremental.upsert(stored, items, keys)
+            self.json['pull_requests'].update({key: items[key] for key in keys})
+        self.watermarks.save(self.repo.full_name, 'pull_requests', keys, newest, items)
+
     def _extract_param_info(self, param):
         if param in (PullRequestParams.TITLES, PullRequestParams.TITLES.value):
             self._extract_pull_request_titles()
@@ -55,10 +104,12 @@ class PullRequestModule(MiningModule):
             raise ModuleParamException("Module does not have param: " + str(param))
 
     def _extract_pull_request_titles(self):
-        self.json['pull_requests']['titles'] = [pull.title for pull in self.pulls]
+        titles = self.json['pull_requests']['titles'] = []
+        self.per_pull.append(lambda pull: titles.append(pull.title))
 
     def _extract_pull_request_bodies(self):
-        self.json['pull_requests']['bodies'] = [pull.body for pull in self.pulls]
+        bodies = self.json['pull_requests']['bodies'] = []
+        self.per_pull.append(lambda pull: bodies.append(pull.body))
 
 
 class PullRequestParams(Enum):
@@ -1,8 +1,8 @@
 """Module for mining readme information"""
 import dataclasses
-import re
 from enum import Enum
 
+from modules import readme_text
 from modules.exception import ModuleParamException
 from modules.mining_module import MiningModule
 
@@ -16,14 +16,16 @@ class ReadMeModule(MiningModule):
     ----------
     params : list
         List of parameters to mine.
-        Possible values are: 'content', 'length'
+        Possible values are: 'content', 'length', 'tokens', 'badges'
     verbose : bool
         Whether or not to print out information about the mining process
 
     Attributes
     ----------
     readme : str
-        The readme of the repository
+        The normalized readme of the repository (see readme_text.normalize)
+    features : dict
+        The features of the readme (see readme_text.featurize)
     json : dict
         Dictionary containing information about the readme
     params : list
@@ -39,23 +41,27 @@ class ReadMeModule(MiningModule):
         Extracts the readme from a repository
     _extract_readme_length()
         Extracts the length of the readme from a repository
-    _preprocess_readme()
-        Preprocesses the readme
+    _extract_readme_tokens()
+        Extracts the number of words and distinct words of the readme
+    _extract_readme_badges()
+        Extracts the CI services with a build badge in the readme
     """
     def __init__(self, params=None, verbose=False):
         if verbose:
             print(f"Extracting textual data for repo {super().repo.full_name}")
 
+        self.params = [c.value for c in ReadMeParams] if params is None else params
         try:
-            self.readme = super().repo.get_readme().decoded_content.decode("utf-8")
-            self._preprocess_readme()
+            with self.single_pass():
+                readme = super().repo.get_readme().decoded_content.decode("utf-8")
+            self.features = readme_text.featurize(readme)
         # pylint: disable=broad-except
         except Exception as exception:
             if verbose:
                 print(f"Failed to extract readme for repo {super().repo.full_name}. Error: {exception}")
-            self.readme = ""
+            self.features = readme_text.featurize("")
+        self.readme = self.features['content']
 
-        self.params = [c.value for c in ReadMeParams] if params is None else params
         self.json = {'readme': {}}
 
     def mine(self):
@@ -70,6 +76,10 @@ class ReadMeModule(MiningModule):
             self._extract_readme()
         elif param in (ReadMeParams.LENGTH, ReadMeParams.LENGTH.value):
             self._extract_readme_length()
+        elif param in (ReadMeParams.TOKENS, ReadMeParams.TOKENS.value):
+            self._extract_readme_tokens()
+        elif param in (ReadMeParams.BADGES, ReadMeParams.BADGES.value):
+            self._extract_readme_badges()
         else:
             raise ModuleParamException("Module does not have param: " + str(param))
 
@@ -79,23 +89,13 @@ class ReadMeModule(MiningModule):
     def _extract_readme_length(self):
         self.json['readme']['length'] = len(self.readme)
 
-    def _preprocess_readme(self):
-        # Remove newlines
-        self.readme = self.readme.replace("\n", " ")
-        # Remove urls
-        self.readme = self._remove_urls(self.readme)
-        # Remove unicode characters
-        self.readme = self.readme.encode('ascii', 'ignore').decode('ascii')
-        # Replace every special character with a space
-        self.readme = re.sub(r'[^a-zA-Z0-9]', ' ', self.readme)
-        # Remove multiple spaces
-        self.readme = re.sub(r'\s+', ' ', self.readme).strip()
+    def _extract_readme_tokens(self):
+        self.json['readme']['tokens'] = self.features['tokens']
+        self.json['readme']['distinct_tokens'] = self.features['distinct_tokens']
 
-    def _remove_urls(self, text):
-        url_pattern = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
-        cleaned_text = re.sub(url_pattern, '', text)
+    def _extract_readme_badges(self):
+        self.json['readme']['badges'] = self.features['badges']
 
-        return cleaned_text
 
 class ReadMeParams(Enum):
     """
@@ -103,3 +103,5 @@ class ReadMeParams(Enum):
     """
     CONTENT = "content"
     LENGTH = "length"
+    TOKENS = "tokens"
+    BADGES = "badges"
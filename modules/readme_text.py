@@ -0,0 +1,72 @@
+"""
+Normalization and features of README texts, for one README or for large batches of them on a process
+pool. All patterns are compiled once, at import.
+"""
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+_URL = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+
+# URLs and non-ASCII characters are deleted in one scan. A URL is tried first at every position
+# and its characters are all ASCII, so a URL ends at the first non-ASCII character, just like when
+# the URLs were removed before the non-ASCII characters.
+_REMOVED = re.compile(_URL + r'|[^\x00-\x7f]+')
+_WORD = re.compile(r'[a-zA-Z0-9]+')
+
+# Build status badges of CI services, matched on the raw README since normalization removes URLs.
+# Only the image URLs count (.svg/.png, or a /badge path), not links to a project's builds. The
+# pattern has no groups, which lets re scan much faster; the service is told by the first letter.
+_BADGES = re.compile(
+    r'travis-ci\.(?:org|com)/[^\s)"\'\]>]*?\.(?:svg|png)'
+    r'|circleci\.com/[^\s)"\'\]>]*?(?:\.svg|\.png|/badge)'
+    r'|github\.com/[^/\s]+/[^/\s]+/(?:actions/)?workflows/[^\s)"\'\]>]*badge\.svg'
+)
+_BADGE_SERVICES = {'t': 'travis', 'c': 'circleci', 'g': 'github_actions'}
+
+
+def normalize(text):
+    """
+    Returns text without URLs and non-ASCII characters, with every other character that is not a
+    letter or digit replaced by a space and runs of spaces collapsed into one
+    """
+    return " ".join(tokenize(text))
+
+
+def tokenize(text):
+    """Returns the words (runs of ASCII letters and digits) of text once URLs and non-ASCII characters are removed"""
+    return _WORD.findall(_REMOVED.sub('', text))
+
+
+def ci_badges(text):
+    """Returns the sorted names of the CI services ('circleci', 'github_actions', 'travis') with a badge in text"""
+    return sorted({_BADGE_SERVICES[badge[0]] for badge in _BADGES.findall(text.lower())})
+
+
+def featurize(text):
+    """
+    Returns {'content': ..., 'length': ..., 'tokens': ..., 'distinct_tokens': ..., 'badges': ...} of
+    a raw README: its normalized text and that text's length, the number of words and of distinct
+    (case-insensitive) words, and the CI badges in it
+    """
+    tokens = tokenize(text)
+    content = " ".join(tokens)
+    return {
+        'content': content,
+        'length': len(content),
+        'tokens': len(tokens),
+        'distinct_tokens': len({token.lower() for token in tokens}),
+        'badges': ci_badges(text),
+    }
+
+
+def featurize_batch(texts, processes=None, chunksize=256):
+    """
+    Returns the features (see featurize) of every raw README in texts, in the same order, computed
+    on a pool of processes (os.cpu_count() if None). READMEs are sent to the workers in chunks of
+    chunksize to keep the cost of pickling them low.
+    """
+    texts = list(texts)
+    if processes == 1 or len(texts) <= chunksize:
+        return [featurize(text) for text in texts]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(featurize, texts, chunksize=chunksize))
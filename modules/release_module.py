@@ -1,14 +1,24 @@
 """Module for mining release information"""
 from enum import Enum
 
+from modules import incremental
 from modules.exception import ModuleParamException
 from modules.mining_module import MiningModule
+from modules.pagination import stream
 
 
 class ReleaseModule(MiningModule):
     """
     This class mines release information
 
+    Parameters
+    ----------
+    params : list
+        List of parameters to mine. Possible values are: 'date'
+    watermarks : WatermarkStore
+        When given, only the releases that are newer than the newest release of the previous run
+        are fetched, and the older ones are taken from the store
+
     Attributes
     ----------
     releases : PaginatedList[GitRelease]
@@ -24,14 +34,18 @@ class ReleaseModule(MiningModule):
         The main entry point to this class. Calling this function will mine all the data in the body
     _extract_param_info(param)
         Calls the right function given a parameter from self.params
+    _mine_incrementally()
+        Extracts the params from the releases since the previous run and merges the stored ones
     _extract_release_date()
         Extracts the publishing date of all releases
     """
 
-    def __init__(self, params=None):
+    def __init__(self, params=None, watermarks=None):
         self.releases = super().repo.get_releases()
+        self.watermarks = watermarks
         self.json = {'releases': {}}
         self.params = [r.value for r in ReleaseParams] if params is None else params
+        self.per_release = []
 
     def mine(self):
         for param in self.params:
@@ -39,10 +53,40 @@ class ReleaseModule(MiningModule):
                 self._extract_release_date()
             else:
                 raise ModuleParamException("Module does not have param: " + str(param))
+
+        with self.single_pass():
+            if self.per_release and self.watermarks is not None:
+                self._mine_incrementally()
+            elif self.per_release:
+                for release in stream(self.releases):
+                    for extract in self.per_release:
+                        extract(release)
         return self.json
 
+    def _mine_incrementally(self):
+        keys = list(self.json['releases'])
+        _, stored = self.watermarks.load(self.repo.full_name, 'releases', keys)
+
+        # releases are listed newest first, so everything before the first known release is new
+        known = set(stored['ids']) if stored else set()
+        ids = []
+        for release in stream(self.releases):
+            if release.id in known:
+                break
+            ids.append(release.id)
+            for extract in self.per_release:
+                extract(release)
+
+        items = {'ids': ids, **self.json['releases']}
+        if stored:
+            items = incremental.prepend(stored, items, keys)
+            self.json['releases'].update({key: items[key] for key in keys})
+        # the watermark is the id of the newest release
+        self.watermarks.save(self.repo.full_name, 'releases', keys, next(iter(items['ids']), None), items)
+
     def _extract_release_date(self):
-        self.json['releases']['dates'] = [release.published_at for release in self.releases]
+        dates = self.json['releases']['dates'] = []
+        self.per_release.append(lambda release: dates.append(release.published_at))
 
 
 class ReleaseParams(Enum):
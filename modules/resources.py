@@ -0,0 +1,101 @@
+"""Shared per-repository API resources that several modules need"""
+import threading
+from enum import Enum
+
+from github import GithubException
+
+from engine.work_queue import is_transient
+from modules.pagination import count
+from modules.tree import RepoTree
+
+
+class Resource(Enum):
+    """
+    A class that holds enum values for the API resources that modules can share
+    """
+    COMMITS = 'commits'
+    CONTRIBUTORS = 'contributors'
+    WORKFLOWS = 'workflows'
+    TREE = 'tree'
+
+
+# How each resource is fetched from a repository. Paginated lists are lazy; see RepoResources for
+# what sharing one saves.
+FETCHERS = {
+    Resource.COMMITS: lambda repo: repo.get_commits(),
+    Resource.CONTRIBUTORS: lambda repo: repo.get_contributors(),
+    Resource.WORKFLOWS: lambda repo: repo.get_workflows(),
+    Resource.TREE: RepoTree.fetch,
+}
+
+
+class RepoResources:
+    """
+    Fetches each shared resource of one repository at most once and hands the same object to every
+    module that asks for it. For the tree snapshot that is all of its data. For a paginated list it
+    is the list object and its count; pages that are iterated from the list (as the contributors
+    and workflows are) are kept in it and shared, but the commits are streamed so that their pages
+    are not kept, and every module that streams them downloads them again. Modules
+    declare the resources they use in required_resources, so that the extractor can fetch them up
+    front (see plan) before the modules run. Safe to use from the threads that mine the modules of
+    a repository concurrently.
+
+    Methods
+    -------
+    get(resource, repo)
+        Returns the resource, fetching it from repo the first time
+    count(resource, repo)
+        Returns the total count of a paginated resource, requesting it at most once
+    prefetch(resources, repo)
+        Fetches all given resources that were not fetched yet
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._counts = {}
+        self._locks = {resource: threading.Lock() for resource in Resource}
+
+    def get(self, resource, repo):
+        """Returns resource, fetching it from repo if no module asked for it before"""
+        resource = Resource(resource)
+        with self._locks[resource]:
+            if resource not in self._values:
+                try:
+                    self._values[resource] = FETCHERS[resource](repo)
+                except GithubException as exception:
+                    # remember failures too (e.g. the contents of an empty repository), so that
+                    # every module gets the same error without another request; transient ones
+                    # are not remembered, so that a module that is retried fetches the resource again
+                    if is_transient(exception):
+                        raise
+                    self._values[resource] = exception
+
+        value = self._values[resource]
+        if isinstance(value, GithubException):
+            raise value
+        return value
+
+    def count(self, resource, repo):
+        """
+        Returns the number of elements of a paginated resource, counted with a single request (see
+        modules.pagination.count) the first time any module asks for it.
+        """
+        resource = Resource(resource)
+        value = self.get(resource, repo)
+        with self._locks[resource]:
+            if resource not in self._counts:
+                self._counts[resource] = count(value)
+        return self._counts[resource]
+
+    def prefetch(self, resources, repo):
+        """Fetches every resource in resources"""
+        for resource in resources:
+            self.get(resource, repo)
+
+
+def plan(module_classes):
+    """Returns the resources needed by any of module_classes, in a stable order"""
+    needed = set()
+    for module_class in module_classes:
+        needed.update(getattr(module_class, 'required_resources', ()))
+    return [resource for resource in Resource if resource in needed]
@@ -1,10 +1,10 @@
 """Module for mining size information"""
 from enum import Enum
 
-from modules.commits_module import CommitsModule, CommitParams
-from modules.contributors_module import ContributorsModule, ContributorsParams
 from modules.exception import ModuleParamException
 from modules.mining_module import MiningModule
+from modules.pagination import count
+from modules.resources import Resource
 
 
 class SizeModule(MiningModule):
@@ -28,11 +28,9 @@ class SizeModule(MiningModule):
         _extract_repo_size():
             Extracts the size of the repository.
         _extract_number_of_files():
-            Extracts the count of files in the repository.
+            Extracts the count of files in the repository, including those in nested directories.
         _extract_number_of_directories():
             Extracts the count of directories in the repository, including nested directories.
-        _count_dirs(directory):
-            Recursive function to count the number of directories in the repository.
         _extract_number_of_branches():
             Extracts the count of branches in the repository.
         _extract_commit_count():
@@ -40,9 +38,12 @@ class SizeModule(MiningModule):
         _extract_contributors_count():
             Extracts the count of contributors in the repository.
     """
+    required_resources = (Resource.TREE, Resource.COMMITS, Resource.CONTRIBUTORS)
+
     def __init__(self, params):
         self.repo = super().repo
-        self.repo_contents = self.repo.get_contents("")
+        # file and directory counts come from the tree snapshot, fetched with a single request
+        self.tree = self.shared(Resource.TREE)
         self.json = {'size': {}}
         self.params = params
 
@@ -72,38 +73,22 @@ class SizeModule(MiningModule):
         self.json['size']['repos_size'] = size
 
     def _extract_number_of_files(self):
-        file_count = len(self.repo_contents)
+        file_count = len(self.tree.files())
         self.json['size']['file_count'] = file_count
 
     def _extract_number_of_directories(self):
-        directories_count = self._count_dirs(self.repo_contents)
+        directories_count = len(self.tree.directories())
         self.json['size']['directories_count'] = directories_count
 
-    def _count_dirs(self, directory):
-        num_dirs = 0
-        for item in directory:
-            if item.type == "dir":
-                num_dirs += 1
-                num_dirs += self._count_dirs((self.repo.get_contents(item.path)))
-        return num_dirs
-
     def _extract_number_of_branches(self):
-        branch_count = self.repo.get_branches().totalCount
+        branch_count = count(self.repo.get_branches())
         self.json['size']['branch_count'] = branch_count
 
     def _extract_commit_count(self):
-        commit_module = CommitsModule([CommitParams.COUNT])
-        commit_count = commit_module.mine()
-        key = next(iter(commit_count))
-        value = commit_count[key]
-        self.json['size']["commits_count"] = value['count']
+        self.json['size']["commits_count"] = self.shared_count(Resource.COMMITS)
 
     def _extract_contributors_count(self):
-        contributors_module = ContributorsModule([ContributorsParams.COUNT])
-        contributors_count = contributors_module.mine()
-        key = next(iter(contributors_count))
-        value = contributors_count[key]
-        self.json['size']["contributors_count"] = value['count']
+        self.json['size']["contributors_count"] = self.shared_count(Resource.CONTRIBUTORS)
 
 
 class SizeParams(Enum):
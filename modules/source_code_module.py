@@ -18,6 +18,11 @@ class SourceCodeModule(MiningModule):
         The directory where the source code will be exported to
     verbose : bool
         Whether or not to print out information about the mining process
+    clones : CloneCache
+        When given, the source code is checked out from the mirror of the repository in this clone
+        cache, which is cloned once and then only fetched. The mirror is updated on the pool of the
+        cache while the other modules run, and an existing export_dir is updated instead of cloned
+        again. Without it, the full repository is cloned from GitHub into export_dir.
 
     Attributes
     ----------
@@ -29,7 +34,17 @@ class SourceCodeModule(MiningModule):
     mine()
         The main entry point to this class. Calling this function will mine all the data in the body
     """
-    def __init__(self, export_dir, verbose=False):
+    def __init__(self, export_dir, verbose=False, clones=None):
+        self.export_dir = export_dir
+        self.verbose = verbose
+        self.clones = clones
+        self.json = {'source_code_dir': export_dir}
+
+        if clones is not None:
+            # start fetching right away; mine() waits for it
+            clones.submit(super().repo.full_name, blobs=True, history=False)
+            return
+
         start_time = time.time()
 
         if verbose:
@@ -37,11 +52,14 @@ class SourceCodeModule(MiningModule):
 
         repo_url = f"https://github.com/{super().repo.full_name}.git"
         Repo.clone_from(repo_url, export_dir)
-        self.json = {'source_code_dir': export_dir}
 
         if verbose:
             print(f"Cloning finished in {time.time() - start_time} seconds")
 
     def mine(self):
         """Returns a dictionary with all the mined data"""
+        if self.clones is not None:
+            if self.verbose:
+                print(f"Exporting repo {self.repo.full_name} to {self.export_dir}")
+            self.clones.export(self.repo.full_name, self.export_dir)
         return self.json
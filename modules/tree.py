@@ -0,0 +1,80 @@
+"""Snapshot of the full file tree of a repository, fetched with the Git Trees API"""
+import posixpath
+
+
+class RepoTree:
+    """
+    The paths of all files and directories on the default branch of a repository, indexed in memory.
+    The tree is fetched with one recursive git/trees request. When GitHub truncates the response
+    (very large repositories), the tree is fetched level by level instead: every subtree is
+    requested recursively on its own, down to the level where the responses are complete.
+
+    Parameters
+    ----------
+    entries : dict
+        {path: type} of every entry, where type is 'blob' (file), 'tree' (directory) or 'commit'
+        (submodule)
+    shas : dict
+        {path: git object SHA} of every entry; for files this is the blob SHA of their contents
+
+    Methods
+    -------
+    fetch(repo)
+        Fetches the tree of the default branch of repo
+    files()
+        Returns the paths of all files
+    directories()
+        Returns the paths of all directories
+    children(directory)
+        Returns the paths of the entries directly inside directory
+    exists(path)
+        Whether path is in the tree
+    """
+
+    def __init__(self, entries, shas=None):
+        self.entries = entries
+        self.shas = {} if shas is None else shas
+        self._children = {}
+        for path in entries:
+            self._children.setdefault(posixpath.dirname(path), []).append(path)
+
+    @classmethod
+    def fetch(cls, repo):
+        """Fetches the tree of the default branch of repo"""
+        entries, shas = {}, {}
+        _add_tree(repo, repo.default_branch, "", entries, shas)
+        return cls(entries, shas)
+
+    def files(self):
+        """Returns the paths of all files"""
+        return [path for path, entry_type in self.entries.items() if entry_type == "blob"]
+
+    def directories(self):
+        """Returns the paths of all directories"""
+        return [path for path, entry_type in self.entries.items() if entry_type == "tree"]
+
+    def children(self, directory=""):
+        """Returns the paths of the entries directly inside directory, "" being the root"""
+        return list(self._children.get(directory, []))
+
+    def exists(self, path):
+        """Whether path is a file or directory in the tree"""
+        return path in self.entries
+
+
+def _add_tree(repo, sha, prefix, entries, shas):
+    tree = repo.get_git_tree(sha, recursive=True)
+    if tree.raw_data.get("truncated"):
+        # too large for one response: take this level only, and fetch every subtree separately
+        tree = repo.get_git_tree(sha)
+        for element in tree.tree:
+            path = prefix + element.path
+            entries[path] = element.type
+            shas[path] = element.sha
+            if element.type == "tree":
+                _add_tree(repo, element.sha, path + "/", entries, shas)
+        return
+
+    for element in tree.tree:
+        entries[prefix + element.path] = element.type
+        shas[prefix + element.path] = element.sha
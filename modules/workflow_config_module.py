@@ -1,13 +1,16 @@
 """Module for mining workflow config files"""
+import base64
 import dataclasses
-import os
 from enum import Enum
 
 from github import GithubException
 
-from modules.commits_module import CommitParams, CommitsModule
+from engine.blobs import default_store
+from modules.commits_module import file_histories
 from modules.exception import ModuleParamException
 from modules.mining_module import MiningModule
+from modules.resources import Resource
+from modules.workflow_features import PARSE_CACHE
 
 
 @dataclasses.dataclass
@@ -15,6 +18,21 @@ class WorkflowConfigModule(MiningModule):
     """
     This class mines workflow config .yml files
 
+    Parameters
+    ----------
+    params : list
+        List of parameters to mine. Possible values are: 'github_actions_config', 'travis_ci_config',
+        'commits', 'features'
+    clones : CloneCache
+        When given, the commit history of the config files is read from the mirror of the
+        repository in this clone cache instead of from the API
+    parse_cache : WorkflowParseCache
+        The cache of parsed config features, by blob SHA. Defaults to one cache shared by all
+        modules of the process.
+    blob_store : BlobStore
+        The store the config files are saved to. Defaults to one store in out/ shared by all
+        modules of the process.
+
     Attributes
     ----------
     json : dict
@@ -31,15 +49,24 @@ class WorkflowConfigModule(MiningModule):
         Extracts the GitHub actions workflow config files from a repository
     _extract_travis_ci_config()
         Extracts the TravisCI workflow config files from a repository
+    _extract_commits()
+        Extracts the commit history of all found config files in one go
+    _extract_features()
+        Extracts the triggers, jobs, matrix size, runners, actions and caching of all found config files
     _is_yml_file()
         Checks whether a filename ends with ".yml" or ".yaml"
     _store_config_file()
-        Saves a workflow config file to a "out/{repo_name}/{ci_platform}" folder
+        Saves a workflow config file to the blob store, unless its blob is already there
     """
 
+    required_resources = (Resource.TREE,)
+
     # Params, represent the information you want extracted from the Workflow Module.
     # Default behaviour: no params passed: all workflow information extracted.
-    def __init__(self, params=None):
+    def __init__(self, params=None, clones=None, parse_cache=None, blob_store=None):
+        self.clones = clones
+        self.parse_cache = PARSE_CACHE if parse_cache is None else parse_cache
+        self.blob_store = default_store() if blob_store is None else blob_store
         self.json = {
                         'workflow_files': [],
                         'workflow_platforms': {
@@ -62,35 +89,37 @@ class WorkflowConfigModule(MiningModule):
             self._extract_travis_ci_config()
         elif param in (WorkflowConfigParams.COMMITS, WorkflowConfigParams.COMMITS.value):
             self._extract_commits()
+        elif param in (WorkflowConfigParams.FEATURES, WorkflowConfigParams.FEATURES.value):
+            self._extract_features()
         else:
             raise ModuleParamException("Module does not have param: " + str(param))
 
     def _extract_github_actions_config(self):
         try:
-            contents = super().repo.get_contents(".github/workflows")
-
-            while contents:
-                config_file = contents.pop(0)
-
-                if self._is_yml_file(config_file.name):
-                    self.json['workflow_files'].append({ 'platform': 'github_actions', 'path': config_file.path})
-                    self._store_config_file('github-actions', config_file)
+            tree = self.shared(Resource.TREE)
+            if not tree.exists(".github/workflows"):
+                self.json['workflow_platforms']['github_actions'] = False
+                return
+
+            for path in tree.children(".github/workflows"):
+                if tree.entries[path] == "blob" and self._is_yml_file(path):
+                    self._store_config_file('github_actions', path, tree.shas[path])
         except GithubException:
             self.json['workflow_platforms']['github_actions'] = False
 
 
     def _extract_travis_ci_config(self):
         try:
-            contents = super().repo.get_contents("")
+            tree = self.shared(Resource.TREE)
+            contents = tree.children()
             travis_ci_detected = False
 
             while contents and not travis_ci_detected:
-                config_file = contents.pop(0)
+                path = contents.pop(0)
 
-                if (self._is_yml_file(config_file.name) and config_file.name.startswith('.travis')):
+                if (tree.entries[path] == "blob" and self._is_yml_file(path) and path.startswith('.travis')):
                     travis_ci_detected = True
-                    self.json['workflow_files'].append({ 'platform': 'travis_ci', 'path': config_file.path})
-                    self._store_config_file('travis-ci', config_file)
+                    self._store_config_file('travis_ci', path, tree.shas[path])
 
             if not travis_ci_detected:
                 self.json['workflow_platforms']['travis_ci'] = False
@@ -99,24 +128,29 @@ class WorkflowConfigModule(MiningModule):
             self.json['workflow_platforms']['travis_ci'] = False
 
     def _extract_commits(self):
+        histories = file_histories(
+            self.repo, [file['path'] for file in self.json['workflow_files']], self.clones
+        )
         for file in self.json['workflow_files']:
-            print(file)
-            commit_module = CommitsModule([CommitParams.COMMIT_META], path=file['path'])
-            commits = commit_module.mine()
-            file['commits'] = commits['commits']['meta']
+            file['commits'] = histories[file['path']]
 
+    def _extract_features(self):
+        for file in self.json['workflow_files']:
+            file['features'] = self.parse_cache.parse(
+                file['platform'], file['sha'], lambda sha=file['sha']: self.blob_store.get(sha).decode("utf-8")
+            )
 
     def _is_yml_file(self, filename):
         return filename.endswith('.yml') or filename.endswith('.yaml')
 
-    def _store_config_file(self, platform_name, config_file):
-        out_filename = "out/" + super().repo.name + "/" + platform_name + "/" + config_file.name
-
-        os.makedirs(os.path.dirname(out_filename), exist_ok=True)
-
-        with open(out_filename, "w", encoding="utf-8") as out_file:
-            out_file.write(config_file.decoded_content.decode("utf-8"))
-            out_file.close()
+    def _store_config_file(self, platform, path, sha):
+        # the blob SHA from the tree is the same for identical files in any repository, so a
+        # config that is already stored is not downloaded again
+        if not self.blob_store.has(sha):
+            blob = super().repo.get_git_blob(sha)
+            sha = self.blob_store.put(base64.b64decode(blob.content))
+        self.blob_store.add(super().repo.full_name, platform, path, sha)
+        self.json['workflow_files'].append({'platform': platform, 'path': path, 'sha': sha})
 
 
 # Parameters of the Workflow Config
@@ -127,3 +161,4 @@ class WorkflowConfigParams(Enum):
     GITHUB_ACTIONS_CONFIG = 'github_actions_config'
     TRAVIS_CI_CONFIG = 'travis_ci_config'
     COMMITS = 'commits'
+    FEATURES = 'features'
@@ -0,0 +1,245 @@
+"""
+Structural features of CI workflow configs (GitHub Actions workflows and .travis.yml): triggers,
+jobs, matrix size, runners, actions used and caching. Parsed features are cached by the git blob SHA
+of the config, so a config that is shared by many repositories (forks, starter workflows) is parsed
+once per run.
+"""
+import collections
+import itertools
+import re
+import threading
+
+import yaml
+
+# The C loader is several times faster, but only available when PyYAML was built with libyaml
+_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# runs-on: ${{ matrix.os }} runs on every os of the matrix
+_MATRIX_EXPRESSION = re.compile(r'^\$\{\{\s*matrix\.([\w-]+)\s*\}\}$')
+
+# Keys of .travis.yml whose lists are expanded into the build matrix
+_TRAVIS_MATRIX_KEYS = (
+    'os', 'arch', 'dist', 'env', 'compiler', 'rvm', 'python', 'node_js', 'jdk', 'go', 'php', 'scala',
+    'perl', 'elixir', 'otp_release', 'rust', 'dart', 'julia', 'r', 'ghc', 'haxe', 'crystal', 'd',
+    'gemfile', 'xcode_scheme', 'osx_image', 'mono', 'dotnet',
+)
+
+
+def parse_workflow(platform, text):
+    """
+    Returns the features of a workflow config of platform ('github_actions' or 'travis_ci'):
+    {'valid': ..., 'triggers': ..., 'jobs': ..., 'matrix_jobs': ..., 'runners': ..., 'actions': ...,
+    'cache_steps': ...}. matrix_jobs is the number of jobs after the matrices are expanded, and
+    triggers are only read from GitHub Actions workflows. A config that is not a valid YAML mapping
+    has valid False and empty features.
+    """
+    try:
+        config = yaml.load(text, Loader=_LOADER)
+    except yaml.YAMLError:
+        config = None
+    if not isinstance(config, dict):
+        return _features(valid=False)
+    if platform == 'travis_ci':
+        return _travis_features(config)
+    return _github_actions_features(config)
+
+
+class WorkflowParseCache:
+    """
+    Parsed workflow features by git blob SHA, shared by all threads. The least recently used
+    features are dropped when more than max_entries are cached.
+
+    Parameters
+    ----------
+    max_entries : int
+        Maximum number of cached configs
+
+    Attributes
+    ----------
+    hits : int
+        Number of configs whose features came from the cache
+    misses : int
+        Number of configs that were parsed
+
+    Methods
+    -------
+    parse(platform, sha, read)
+        Returns the features of a config, reading and parsing it only if its SHA is not cached
+    stats()
+        Returns the hit/miss counters and the number of cached configs
+    """
+
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._features = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse(self, platform, sha, read):
+        """
+        Returns the features (see parse_workflow) of the config with blob SHA sha. read is a function
+        that returns the text of the config; it is only called when the features are not cached.
+        """
+        key = (platform, sha)
+        with self._lock:
+            features = self._features.get(key)
+            if features is not None:
+                self._features.move_to_end(key)
+                self.hits += 1
+                return features
+
+        # parsed outside the lock; two threads may both parse a new SHA, with the same result
+        features = parse_workflow(platform, read())
+        with self._lock:
+            self.misses += 1
+            self._features[key] = features
+            while len(self._features) > self.max_entries:
+                self._features.popitem(last=False)
+        return features
+
+    def stats(self):
+        """Returns {'hits': ..., 'misses': ..., 'entries': ...}"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._features)}
+
+
+# The cache used by WorkflowConfigModule unless it is given another one
+PARSE_CACHE = WorkflowParseCache()
+
+
+def _github_actions_features(config):
+    # YAML 1.1 reads the key "on" as the boolean True
+    triggers = config.get('on', config.get(True))
+    jobs = config.get('jobs') if isinstance(config.get('jobs'), dict) else {}
+
+    runners, actions = set(), set()
+    matrix_jobs = cache_steps = 0
+    for job in jobs.values():
+        if not isinstance(job, dict):
+            continue
+        strategy = job.get('strategy')
+        matrix = strategy.get('matrix') if isinstance(strategy, dict) else None
+        runners.update(_runners(job.get('runs-on'), matrix))
+        matrix_jobs += _matrix_size(matrix)
+        # a job can call a reusable workflow instead of running steps
+        actions.update(_action_name(uses) for uses in _strings(job.get('uses')))
+        for step in job.get('steps') or []:
+            if not isinstance(step, dict):
+                continue
+            uses = step.get('uses')
+            if isinstance(uses, str):
+                actions.add(_action_name(uses))
+                with_ = step.get('with')
+                if _action_name(uses) == 'actions/cache' or (isinstance(with_, dict) and with_.get('cache')):
+                    cache_steps += 1
+
+    return _features(
+        triggers=sorted(_trigger_names(triggers)), jobs=len(jobs), matrix_jobs=matrix_jobs,
+        runners=sorted(runners), actions=sorted(actions), cache_steps=cache_steps,
+    )
+
+
+def _travis_features(config):
+    matrix = config.get('jobs', config.get('matrix'))
+    matrix = matrix if isinstance(matrix, dict) else {}
+    include = [job for job in matrix.get('include') or [] if isinstance(job, dict)]
+    exclude = [job for job in matrix.get('exclude') or [] if isinstance(job, dict)]
+
+    dimensions = {}
+    for key in _TRAVIS_MATRIX_KEYS:
+        # env is either a list of variables or {'jobs': [...], 'global': [...]}
+        values = config.get(key)
+        values = values.get('jobs', values.get('matrix')) if isinstance(values, dict) else values
+        if values is not None:
+            dimensions[key] = values if isinstance(values, list) else [values]
+    # without any list, the root of the config is one job, unless jobs are only included
+    root_jobs = _expand(dimensions, exclude) if dimensions or not include else []
+
+    runners = set(_strings(config.get('os'))) or {'linux'}
+    for job in include:
+        runners.update(_strings(job.get('os')))
+    # the triggers of Travis CI are set in its web settings, not in the config
+    return _features(
+        jobs=len(include) + (1 if root_jobs else 0),
+        matrix_jobs=len(root_jobs) + len(include), runners=sorted(runners), actions=[],
+        cache_steps=1 if config.get('cache') else 0,
+    )
+
+
+def _features(valid=True, triggers=(), jobs=0, matrix_jobs=0, runners=(), actions=(), cache_steps=0):
+    # pylint: disable=too-many-arguments
+    return {
+        'valid': valid, 'triggers': list(triggers), 'jobs': jobs, 'matrix_jobs': matrix_jobs,
+        'runners': list(runners), 'actions': list(actions), 'cache_steps': cache_steps,
+    }
+
+
+def _matrix_size(matrix):
+    """Returns the number of jobs of a GitHub Actions matrix, 1 if it is an expression"""
+    if not isinstance(matrix, dict):
+        return 1
+    dimensions = {
+        key: values for key, values in matrix.items()
+        if key not in ('include', 'exclude') and isinstance(values, list)
+    }
+    exclude = [job for job in _list(matrix.get('exclude')) if isinstance(job, dict)]
+    combinations = _expand(dimensions, exclude) if dimensions else []
+
+    # an include that would overwrite an original value of every combination adds a new job
+    added = 0
+    for job in _list(matrix.get('include')):
+        if not isinstance(job, dict):
+            continue
+        if not any(
+            all(combination.get(key, value) == value for key, value in job.items() if key in dimensions)
+            for combination in combinations
+        ):
+            added += 1
+    return max(len(combinations) + added, 1)
+
+
+def _runners(runs_on, matrix):
+    """Returns the runner labels of a job, with the values of the matrix for a matrix expression"""
+    runners = []
+    for label in _strings(runs_on):
+        match = _MATRIX_EXPRESSION.match(label)
+        if match and isinstance(matrix, dict) and match.group(1) in matrix:
+            key = match.group(1)
+            runners += _strings(matrix[key])
+            runners += [job[key] for job in _list(matrix.get('include')) if isinstance(job, dict) and key in job]
+        else:
+            runners.append(label)
+    return [runner for runner in runners if isinstance(runner, str)]
+
+
+def _expand(dimensions, exclude):
+    """Returns the combinations of the dimension values that do not match an exclude"""
+    keys = list(dimensions)
+    combinations = [dict(zip(keys, values)) for values in itertools.product(*dimensions.values())]
+    return [
+        combination for combination in combinations
+        if not any(all(combination.get(key) == value for key, value in job.items()) for job in exclude)
+    ]
+
+
+def _trigger_names(triggers):
+    if isinstance(triggers, dict):
+        return [str(name) for name in triggers]
+    return [str(name) for name in _list(triggers)]
+
+
+def _action_name(uses):
+    """Returns the action of a uses value without its version, e.g. actions/checkout"""
+    return uses.split('@', 1)[0]
+
+
+def _strings(value):
+    """Returns the strings in a value that is a string or a list of strings"""
+    return [item for item in _list(value) if isinstance(item, str)]
+
+
+def _list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
@@ -4,6 +4,8 @@ from enum import Enum
 
 from modules.exception import ModuleParamException
 from modules.mining_module import MiningModule
+from modules.pagination import count
+from modules.resources import Resource
 
 
 @dataclasses.dataclass
@@ -42,10 +44,14 @@ class WorkflowModule(MiningModule):
         Extracts workflow update date.
     """
 
+    required_resources = (Resource.WORKFLOWS,)
+
     # Params, represent the information you want extracted from the Workflow Module.
     # Default behaviour: no params passed: all workflow information extracted.
-    def __init__(self, repo, params=None):
-        self.workflows = repo.get_workflows()
+    # Without a repo, the workflows of the repository of the mining context are shared with the other modules.
+    def __init__(self, repo=None, params=None):
+        self.shared_workflows = repo is None
+        self.workflows = self.shared(Resource.WORKFLOWS) if repo is None else repo.get_workflows()
         self.json = {'workflow_count' : {},
                      'workflows': {}
                      }
@@ -53,12 +59,13 @@ class WorkflowModule(MiningModule):
 
     def mine(self):
         """Mines all the data in self.params and returns a dictionary with all the mined data"""
-        self._extract_workflow_count()
-        for workflow in self.workflows:
-            workflow_data = {}
-            for param in self.params:
-                self._extract_param_info(param=param, workflow=workflow, workflow_data=workflow_data)
-            self.json['workflows'][workflow.id] = workflow_data
+        with self.single_pass():
+            self._extract_workflow_count()
+            for workflow in self.workflows:
+                workflow_data = {}
+                for param in self.params:
+                    self._extract_param_info(param=param, workflow=workflow, workflow_data=workflow_data)
+                self.json['workflows'][workflow.id] = workflow_data
         return self.json
 
     # Maps Workflow Param Enum to Param Extractor Function
@@ -76,7 +83,8 @@ class WorkflowModule(MiningModule):
 
 
     def _extract_workflow_count(self):
-        self.json['workflow_count'] = self.workflows.totalCount
+        self.json['workflow_count'] = self.shared_count(Resource.WORKFLOWS) if self.shared_workflows else \
+            count(self.workflows)
     def _extract_workflow_name(self, workflow, workflow_data):
         workflow_data['name'] = workflow.name
     def _extract_workflow_id(self, workflow, workflow_data):